@@ -1,6 +1,6 @@
 from django.contrib import admin
 from core.admin import CoreAdmin
-from tenant.admin import TenantCoreAdmin
+from tenant.admin import TenantCompanyAutocompleteMixin, TenantCoreAdmin
 from .models import (
     Company,
     ExpenseType,
@@ -9,7 +9,7 @@ from .models import (
 
 
 @admin.register(Company)
-class CompanyAdmin(CoreAdmin):
+class CompanyAdmin(TenantCompanyAutocompleteMixin, CoreAdmin):
     list_display = [
         "code",
         "legal_name",
@@ -25,6 +25,9 @@ class CompanyAdmin(CoreAdmin):
 
 @admin.register(Expense)
 class ExpenseAdmin(TenantCoreAdmin):
+    estimated_count = True
+    keyset_pagination = True
+    show_full_result_count = False
     list_display = [
         "expense_type",
         "amount",
@@ -52,7 +55,8 @@ class ExpenseAdmin(TenantCoreAdmin):
 @admin.register(ExpenseType)
 class ExpenseTypeAdmin(TenantCoreAdmin):
     list_display = ["name", "tenant_company"]
-    search_fields = ["name"]
+    # Prefix search, uses expensetype_tc_name_prefix_idx.
+    search_fields = ["^name"]
     autocomplete_fields = [
         "created_by",
         "updated_by",
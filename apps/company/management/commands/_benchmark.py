@@ -0,0 +1,78 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+
+from company.models import Company, Expense, ExpenseType
+from native_account.models import Account, AccountCompany, RoleChoices
+
+
+def seed_tenant(expenses, expense_types=None, members=0):
+    """
+    Creates an owner user with an account, a company, `expense_types` expense types
+    (defaults to `expenses`), `expenses` expenses and `members` member accounts.
+    Meant to be called inside a transaction which is rolled back afterwards.
+    Returns (owner user, company).
+    """
+    User = get_user_model()
+    expense_types = expenses if expense_types is None else expense_types
+    suffix = uuid.uuid4().hex[:12]
+    user = User.objects.create_user(
+        f"benchmark_{suffix}",
+        f"benchmark_{suffix}@example.com",
+        first_name="Bench",
+        last_name="Mark",
+    )
+    account = Account(user=user, phone="0")
+    account.save(user=user)
+    company = Company(
+        legal_name=f"Benchmark {suffix}", tax_office="-", tax_no=f"bm-{suffix}"
+    )
+    company.save(user=user)
+    AccountCompany(account=account, company=company, role=RoleChoices.OWNER).save(
+        user=user
+    )
+
+    types = ExpenseType.objects.bulk_create(
+        [ExpenseType(name=f"Type {i}") for i in range(max(expense_types, 1))],
+        tenant_user=user,
+    )
+    Expense.objects.bulk_create(
+        [
+            Expense(
+                expense_type=types[i % len(types)],
+                amount=i % 1000,
+                is_approved=i % 2 == 0,
+                approved_by=user if i % 2 == 0 else None,
+                # Soft-deleted/passive rows, as in a real dataset.
+                is_active=i % 10 != 0,
+            )
+            for i in range(expenses)
+        ],
+        tenant_user=user,
+    )
+
+    member_users = User.objects.bulk_create(
+        [
+            User(
+                username=f"benchmark_{suffix}_{i}",
+                email=f"benchmark_{suffix}_{i}@example.com",
+            )
+            for i in range(members)
+        ]
+    )
+    member_accounts = Account.objects.bulk_create(
+        [Account(user=member, phone="0", created_by=user) for member in member_users]
+    )
+    AccountCompany.objects.bulk_create(
+        [
+            AccountCompany(
+                account=member_account,
+                company=company,
+                role=RoleChoices.MEMBER,
+                is_selected=True,
+                created_by=user,
+            )
+            for member_account in member_accounts
+        ]
+    )
+    return user, company
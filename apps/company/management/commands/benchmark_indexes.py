@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from company.management.commands._benchmark import seed_tenant
+from company.models import Expense, ExpenseType
+from company.serializers import ExpenseSerializer, ExpenseTypeSerializer
+from native_account.models import AccountCompany, RoleChoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the query plans of the tenant-isolation hot queries on a seeded dataset, "
+        "with and without the composite indexes. The seeded rows and the dropped indexes "
+        "are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=20)
+        parser.add_argument("--rows", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tenants = [
+                seed_tenant(
+                    options["rows"], expense_types=options["rows"] // 10, members=20
+                )
+                for _ in range(options["tenants"])
+            ]
+            user, company = tenants[-1]
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            queries = {
+                "AccountCompany by (account, is_selected)": AccountCompany.objects.filter(
+                    account__user=user, is_selected=True
+                ),
+                "AccountCompany by (company, is_active, is_deleted)": AccountCompany.objects.filter(
+                    company=company, is_active=True, is_deleted=False
+                ),
+                "AccountCompany by (company, role)": AccountCompany.objects.filter(
+                    company=company, role=RoleChoices.OWNER
+                ),
+                # The querysets of the expense_list/expense_type_list views.
+                "Expense list page": ExpenseSerializer()
+                .get_queryset(
+                    Expense.objects.filter(
+                        tenant_user=user, is_active=True, is_deleted=False
+                    ),
+                    extra_fields=("-created_at", "-id"),
+                )
+                .order_by("-created_at", "-id")[:100],
+                "ExpenseType list by name": ExpenseTypeSerializer()
+                .get_queryset(
+                    ExpenseType.objects.filter(
+                        tenant_user=user, is_active=True, is_deleted=False
+                    ),
+                    extra_fields=("name", "id"),
+                )
+                .order_by("name", "id")[:100],
+            }
+
+            plans = {name: [queryset.explain()] for name, queryset in queries.items()}
+
+            with connection.cursor() as cursor:
+                for model in (AccountCompany, Expense, ExpenseType):
+                    for index in model._meta.indexes:
+                        cursor.execute(
+                            f"DROP INDEX {connection.ops.quote_name(index.name)}"
+                        )
+                cursor.execute("ANALYZE")
+
+            for name, queryset in queries.items():
+                plans[name].append(queryset.explain())
+
+            transaction.set_rollback(True)
+
+        for name, (with_indexes, without_indexes) in plans.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write("  with indexes:")
+            self.stdout.write(self._indent(with_indexes))
+            self.stdout.write("  without indexes:")
+            self.stdout.write(self._indent(without_indexes))
+
+    def _indent(self, plan):
+        return "\n".join(f"    {line}" for line in plan.splitlines())
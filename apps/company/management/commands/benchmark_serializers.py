@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from company.management.commands._benchmark import seed_tenant
+from company.models import Company, Expense, ExpenseType
+from company.serializers import (
+    CompanySerializer,
+    ExpenseSerializer,
+    ExpenseTypeSerializer,
+)
+from native_account.models import AccountCompany
+from native_account.serializers import AccountCompanySerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the query counts of the `_json()` loops and the batch serializers "
+        "for growing row counts. The seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'model':<16}{'rows':>8}{'_json() queries':>18}{'batch queries':>16}"
+            f"{'_json() ms':>12}{'batch ms':>10}  same output"
+        )
+        for size in options["sizes"]:
+            with transaction.atomic():
+                user, company = seed_tenant(size, members=size - 1)
+                cases = [
+                    (
+                        "Company",
+                        Company.objects.filter(id=company.id),
+                        CompanySerializer(),
+                    ),
+                    (
+                        "ExpenseType",
+                        ExpenseType.objects.filter(tenant_user=user),
+                        ExpenseTypeSerializer(),
+                    ),
+                    (
+                        "Expense",
+                        Expense.objects.filter(tenant_user=user),
+                        ExpenseSerializer(),
+                    ),
+                    (
+                        "AccountCompany",
+                        AccountCompany.objects.filter(company=company),
+                        AccountCompanySerializer(),
+                    ),
+                ]
+                for name, queryset, serializer in cases:
+                    self._compare(name, queryset, serializer)
+                transaction.set_rollback(True)
+
+    def _measure(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            started_at = time.perf_counter()
+            result = func()
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+        return result, len(ctx.captured_queries), elapsed_ms
+
+    def _compare(self, name, queryset, serializer):
+        loop_result, loop_queries, loop_ms = self._measure(
+            lambda: [x._json() for x in queryset.all()]
+        )
+        batch_result, batch_queries, batch_ms = self._measure(
+            lambda: serializer.serialize(queryset.all())
+        )
+        self.stdout.write(
+            f"{name:<16}{len(loop_result):>8}{loop_queries:>18}{batch_queries:>16}"
+            f"{loop_ms:>12.1f}{batch_ms:>10.1f}  {loop_result == batch_result}"
+        )
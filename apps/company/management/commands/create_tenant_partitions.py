@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from company.models import Company
+from tenant.partitioning import (
+    create_tenant_partitions,
+    get_partitioned_models,
+    is_partitioning_enabled,
+    partition_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the missing tenant partitions of the LIST-partitioned tables and moves "
+        "the rows of these tenants out of the default partitions. Meant to be run "
+        "periodically, as the owner of the tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", help="Only the given company id.")
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="First convert the tables which are not partitioned yet "
+            "(e.g. TENANT_PARTITIONING_ENABLED was turned on after the migrations). "
+            "The tables are locked while their rows are copied.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write("Partitioning is only supported on PostgreSQL.")
+            return
+        if not is_partitioning_enabled():
+            self.stdout.write("TENANT_PARTITIONING_ENABLED is off.")
+            return
+        models = ", ".join(x._meta.label for x in get_partitioned_models())
+        self.stdout.write(f"Partitioned models: {models or '-'}")
+
+        if options["convert"]:
+            company_ids = list(
+                Company.objects.using("default").order_by().values_list("id", flat=True)
+            )
+            for model in get_partitioned_models():
+                with connection.schema_editor() as schema_editor:
+                    partition_table(
+                        schema_editor,
+                        model,
+                        model.TENANT_PARTITIONING,
+                        model.TENANT_PARTITION_COUNT,
+                        company_ids,
+                    )
+
+        companies = Company.objects.using("default").order_by()
+        if options["company"]:
+            companies = companies.filter(id=options["company"])
+        for company_id in companies.values_list("id", flat=True).iterator():
+            create_tenant_partitions(company_id)
+        self.stdout.write(self.style.SUCCESS("Tenant partitions are created."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from company.models import Company, Expense, ExpenseSummary
+from company.summary import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the ExpenseSummary rows from the expenses. The expense writes wait "
+        "until the rows of their company are rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", help="Only the given company id.")
+
+    def handle(self, *args, **options):
+        companies = Company.objects.using("default").order_by()
+        if options["company"]:
+            companies = companies.filter(id=options["company"])
+        # One transaction per company keeps the locks short.
+        for company_id in companies.values_list("id", flat=True).iterator():
+            rebuild_summaries(Expense, ExpenseSummary, tenant_company_id=company_id)
+        self.stdout.write(self.style.SUCCESS("Expense summaries are rebuilt."))
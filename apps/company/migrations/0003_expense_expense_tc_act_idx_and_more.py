@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:24
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built without locking the tables against writes.
+    atomic = False
+
+    dependencies = [
+        ('company', '0002_expensetype_expense_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(fields=['tenant_company', 'is_active', 'is_deleted'], name='expense_tc_act_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['tenant_company', '-created_at', '-id'], name='expense_tc_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(fields=['tenant_company', 'expense_type'], name='expense_tc_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(fields=['tenant_company', 'date'], name='expense_tc_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expensetype',
+            index=models.Index(fields=['tenant_company', 'is_active', 'is_deleted'], name='expensetype_tc_act_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expensetype',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['tenant_company', 'name'], name='expensetype_tc_name_idx'),
+        ),
+    ]
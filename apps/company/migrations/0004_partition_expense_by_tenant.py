@@ -0,0 +1,16 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+from tenant.partitioning import PartitionByTenant
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0003_expense_expense_tc_act_idx_and_more'),
+    ]
+
+    operations = [
+        PartitionByTenant(model_name='expense', method='list'),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:05
+
+from django.db import migrations
+
+from tenant.rls import EnableTenantRLS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_partition_expense_by_tenant'),
+    ]
+
+    operations = [
+        EnableTenantRLS(model_name='expensetype'),
+        EnableTenantRLS(model_name='expense'),
+    ]
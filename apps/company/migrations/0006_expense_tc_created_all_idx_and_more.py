@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:40
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The expense type index is built without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ('company', '0005_expensetype_rls_expense_rls'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # CONCURRENTLY is not supported on partitioned tables.
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['tenant_company', '-created_at', '-id'], name='expense_tc_created_all_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='expensetype',
+            index=models.Index(models.F('tenant_company'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('name', models.TextField())), name='text_pattern_ops'), name='expensetype_tc_name_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+def build_expense_summaries(apps, schema_editor):
+    """
+    Aggregates the existing expenses into the summary table. The SQL is kept here,
+    so later changes of company.summary do not change what this migration does.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        # The other backends are only used with empty databases (e.g. the tests).
+        return
+    qn = connection.ops.quote_name
+    expense_table = qn(apps.get_model("company", "Expense")._meta.db_table)
+    summary_table = qn(apps.get_model("company", "ExpenseSummary")._meta.db_table)
+    # The writes which commit while the rows are aggregated would be lost.
+    schema_editor.execute(f"LOCK TABLE {expense_table} IN SHARE MODE")
+    schema_editor.execute(
+        f"""
+        INSERT INTO {summary_table}
+            (tenant_company_id, expense_type_id, month, is_approved, is_paid, expense_count, total_amount)
+        SELECT
+            tenant_company_id,
+            expense_type_id,
+            date_trunc('month', COALESCE(date, created_at))::date,
+            is_approved,
+            is_paid,
+            COUNT(*),
+            COALESCE(SUM(amount), 0)
+        FROM {expense_table}
+        WHERE is_active AND NOT is_deleted AND tenant_company_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0006_expense_tc_created_all_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Month')),
+                ('is_approved', models.BooleanField(verbose_name='Is Approved')),
+                ('is_paid', models.BooleanField(verbose_name='Is Paid')),
+                ('expense_count', models.IntegerField(default=0, verbose_name='Expense Count')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total Amount')),
+                ('expense_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='company.expensetype', verbose_name='Expense Type')),
+                ('tenant_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='company.company', verbose_name='Tenant Company')),
+            ],
+            options={
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('tenant_company', 'expense_type', 'month', 'is_approved', 'is_paid'), name='unique_expense_summary')],
+            },
+        ),
+        migrations.RunPython(build_expense_summaries, migrations.RunPython.noop),
+    ]
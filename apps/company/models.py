@@ -1,12 +1,17 @@
 import uuid
 from datetime import datetime
 
+from django.contrib.postgres.indexes import OpClass
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Cast, Upper
 from django.utils.translation import gettext_lazy as _
 from core.models import CoreModel
-from tenant.models import TenantCoreModel
+from tenant.caches import validated_tenant_cache
+from tenant.context import invalidate_account_info
+from tenant.models import TenantCoreManager, TenantCoreModel, TenantQuerySet
+from company import summary
 
 
 class Company(CoreModel):
@@ -42,7 +47,27 @@ class Company(CoreModel):
 
     def save(self, *args, **kwargs):
         self.clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        validated_tenant_cache.delete(str(self.id))
+        # The rows of a new company are stored in the default partitions until
+        # `manage.py create_tenant_partitions` creates its partitions, see tenant.partitioning.
+        if not adding:
+            # The legal name is shown to every member of the company.
+            invalidate_account_info(self.get_member_user_ids())
+
+    def delete(self, *args, **kwargs):
+        company_id = self.id
+        member_user_ids = self.get_member_user_ids()
+        result = super().delete(*args, **kwargs)
+        validated_tenant_cache.delete(str(company_id))
+        invalidate_account_info(member_user_ids)
+        return result
+
+    def get_member_user_ids(self) -> list:
+        return list(
+            set(self.accountcompany_set.values_list("account__user_id", flat=True))
+        )
 
     def _json(self):
         return {
@@ -74,13 +99,28 @@ class ExpenseType(TenantCoreModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(verbose_name=_("Name"))
 
-    class Meta:
+    class Meta(TenantCoreModel.Meta):
         constraints = [
             models.UniqueConstraint(
                 fields=["name", "tenant_company"],
                 name="unique_expense_type_name",
             ),
         ]
+        indexes = [
+            *TenantCoreModel.Meta.indexes,
+            # expense_type_list: tenant's active types ordered by name.
+            models.Index(
+                fields=["tenant_company", "name"],
+                condition=models.Q(is_active=True, is_deleted=False),
+                name="expensetype_tc_name_idx",
+            ),
+            # Admin autocomplete/search: UPPER(name::text) LIKE 'PREFIX%' of "^name".
+            models.Index(
+                "tenant_company",
+                OpClass(Upper(Cast("name", models.TextField())), name="text_pattern_ops"),
+                name="expensetype_tc_name_prefix_idx",
+            ),
+        ]
         ordering = ["name"]
 
     def __str__(self):
@@ -93,8 +133,86 @@ class ExpenseType(TenantCoreModel):
             "tenant_company": self.tenant_company.legal_name,
         }
 
+class ExpenseQuerySet(TenantQuerySet):
+    """
+    Keeps the ExpenseSummary rows up to date on the bulk writes, see company.summary.
+    """
+
+    def __write_with_summary(self, write, pks):
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            rows = self.model._base_manager.db_manager(using).filter(pk__in=pks)
+            before = summary.lock_contributions(rows)
+            with summary.tracked_write():
+                result = write()
+            summary.apply_deltas(
+                summary.get_deltas(summary.aggregate_contributions(rows), before),
+                using=using,
+            )
+        return result
+
+    def bulk_create(self, objs, batch_size=None, **kwargs):
+        objs = list(objs)
+        if summary.is_tracked_write():
+            return super().bulk_create(objs, batch_size=batch_size, **kwargs)
+        if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+            # The inserted/updated rows are only known by the database.
+            return self.__write_with_summary(
+                lambda: super(ExpenseQuerySet, self).bulk_create(
+                    objs, batch_size=batch_size, **kwargs
+                ),
+                [obj.pk for obj in objs],
+            )
+
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            objs = super().bulk_create(objs, batch_size=batch_size, **kwargs)
+            summary.apply_deltas(
+                summary.get_deltas(summary.get_contributions(objs), {}), using=using
+            )
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None, **kwargs):
+        objs = list(objs)
+        if summary.is_tracked_write() or not summary.SUMMARY_FIELDS.intersection(fields):
+            return super().bulk_update(objs, fields, batch_size=batch_size, **kwargs)
+        return self.__write_with_summary(
+            lambda: super(ExpenseQuerySet, self).bulk_update(
+                objs, fields, batch_size=batch_size, **kwargs
+            ),
+            [obj.pk for obj in objs],
+        )
+
+    def update(self, **kwargs):
+        if summary.is_tracked_write() or not summary.SUMMARY_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        return self.__write_with_summary(
+            lambda: super(ExpenseQuerySet, self).update(**kwargs),
+            list(self.values_list("pk", flat=True)),
+        )
+
+    update.alters_data = True
+
+    def delete(self, **kwargs):
+        if summary.is_tracked_write():
+            return super().delete(**kwargs)
+        return self.__write_with_summary(
+            lambda: super(ExpenseQuerySet, self).delete(**kwargs),
+            list(self.values_list("pk", flat=True)),
+        )
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class ExpenseManager(TenantCoreManager):
+    _queryset_class = ExpenseQuerySet
+
+
 class Expense(TenantCoreModel):
     CACHE_KEY = "expense"
+    # Not referenced by other tables, see tenant.partitioning.
+    TENANT_PARTITIONING = "list"
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     expense_type = models.ForeignKey(
@@ -121,8 +239,31 @@ class Expense(TenantCoreModel):
     )
     is_paid = models.BooleanField(default=False, verbose_name=_("Is Paid"))
     paid_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Paid At"))
+    objects = ExpenseManager()
 
-    class Meta:
+    class Meta(TenantCoreModel.Meta):
+        indexes = [
+            *TenantCoreModel.Meta.indexes,
+            # expense_list: tenant's active expenses, keyset-paginated on (-created_at, -id).
+            models.Index(
+                fields=["tenant_company", "-created_at", "-id"],
+                condition=models.Q(is_active=True, is_deleted=False),
+                name="expense_tc_created_idx",
+            ),
+            # Admin changelist: every row of the tenant, keyset-paginated on (-created_at, -id).
+            models.Index(
+                fields=["tenant_company", "-created_at", "-id"],
+                name="expense_tc_created_all_idx",
+            ),
+            models.Index(
+                fields=["tenant_company", "expense_type"],
+                name="expense_tc_type_idx",
+            ),
+            models.Index(
+                fields=["tenant_company", "date"],
+                name="expense_tc_date_idx",
+            ),
+        ]
         ordering = ["-created_at"]
 
     def __str__(self):
@@ -147,4 +288,124 @@ class Expense(TenantCoreModel):
             if self.paid_at
             else "",
             "tenant_company": self.tenant_company.legal_name,
-        }
\ No newline at end of file
+        }
+
+    def __lock_summary_contributions(self, using):
+        if self._state.adding:
+            return {}
+        return summary.lock_contributions(
+            self.__class__._base_manager.db_manager(using).filter(pk=self.pk)
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not summary.SUMMARY_FIELDS.intersection(
+            update_fields
+        ):
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            before = self.__lock_summary_contributions(using)
+            super().save(*args, **kwargs)
+            if update_fields is None:
+                after = summary.get_contributions([self])
+            else:
+                # The other fields of the instance may differ from the database.
+                after = summary.aggregate_contributions(
+                    self.__class__._base_manager.db_manager(using).filter(pk=self.pk)
+                )
+            summary.apply_deltas(summary.get_deltas(after, before), using=using)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            before = self.__lock_summary_contributions(using)
+            deleted = super().delete(*args, **kwargs)
+            summary.apply_deltas(summary.get_deltas({}, before), using=using)
+        return deleted
+
+
+class ExpenseSummaryManager(models.Manager):
+    def __get_tenant_company_id(self, tenant_user):
+        return getattr(
+            Expense.objects, f"_{TenantCoreManager.__name__}__get_tenant_company_id"
+        )(tenant_user=tenant_user)
+
+    async def __aget_tenant_company_id(self, tenant_user):
+        return await getattr(
+            Expense.objects, f"_{TenantCoreManager.__name__}__aget_tenant_company_id"
+        )(tenant_user=tenant_user)
+
+    def __get_totals(self, tenant_company_id, group_by, filters):
+        if not tenant_company_id:
+            return self.none()
+        # A single row with the totals of the tenant.
+        group_by = group_by or ("tenant_company",)
+        return (
+            self.filter(tenant_company_id=tenant_company_id, expense_count__gt=0, **filters)
+            .values(*group_by)
+            .annotate(count=models.Sum("expense_count"), amount=models.Sum("total_amount"))
+            .order_by(*group_by)
+        )
+
+    def totals(self, *group_by, **kwargs):
+        """
+        Returns the expense count and amount of the tenant per `group_by` fields, e.g.
+            ExpenseSummary.objects.totals("month", "expense_type", tenant_user=user, month__gte=start)
+            -> [{"month": date(2026, 1, 1), "expense_type": ..., "count": 12, "amount": Decimal(...)}, ...]
+        Without `group_by`, a single row with the totals of the tenant is returned.
+        Reads O(months x types x 4) summary rows instead of the expenses.
+        The filters can use the fields of ExpenseSummary (expense_type, month, is_approved, is_paid).
+        """
+        user = kwargs.pop("tenant_user", None)
+        assert user, _(
+            "Tenant User parameter is required, for: ExpenseSummaryManager.totals()"
+        )
+        tenant_company_id = self.__get_tenant_company_id(tenant_user=user)
+        return self.__get_totals(tenant_company_id, group_by, kwargs)
+
+    async def atotals(self, *group_by, **kwargs):
+        """
+        Async counterpart of `totals()`, the queryset can be consumed with `async for`.
+        """
+        user = kwargs.pop("tenant_user", None)
+        assert user, _(
+            "Tenant User parameter is required, for: ExpenseSummaryManager.atotals()"
+        )
+        tenant_company_id = await self.__aget_tenant_company_id(tenant_user=user)
+        return self.__get_totals(tenant_company_id, group_by, kwargs)
+
+
+class ExpenseSummary(models.Model):
+    """
+    Count and amount of the active expenses per tenant, expense type, month, approval and
+    payment status. Maintained by the writes of Expense, see company.summary.
+    """
+
+    tenant_company = models.ForeignKey(
+        "company.Company", on_delete=models.CASCADE, verbose_name=_("Tenant Company")
+    )
+    expense_type = models.ForeignKey(
+        "company.ExpenseType", on_delete=models.CASCADE, verbose_name=_("Expense Type")
+    )
+    month = models.DateField(verbose_name=_("Month"))
+    is_approved = models.BooleanField(verbose_name=_("Is Approved"))
+    is_paid = models.BooleanField(verbose_name=_("Is Paid"))
+    expense_count = models.IntegerField(default=0, verbose_name=_("Expense Count"))
+    total_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0, verbose_name=_("Total Amount")
+    )
+    objects = ExpenseSummaryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant_company", "expense_type", "month", "is_approved", "is_paid"],
+                name="unique_expense_summary",
+            ),
+        ]
+        ordering = ["month"]
+
+    def __str__(self):
+        return f"{self.expense_type_id} {self.month:%Y-%m} : {self.expense_count}, {self.total_amount}"
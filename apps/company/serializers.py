@@ -0,0 +1,72 @@
+from core.serializers import BatchSerializer, format_datetime, format_full_name
+
+
+class CompanySerializer(BatchSerializer):
+    fields = (
+        "id",
+        "legal_name",
+        "tax_office",
+        "tax_no",
+        "code",
+        "website",
+        "email",
+    )
+
+    def to_json(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "legal_name": row["legal_name"],
+            "tax_office": row["tax_office"],
+            "tax_no": row["tax_no"],
+            "code": row["code"],
+            "website": row["website"],
+            "email": row["email"],
+        }
+
+
+class ExpenseTypeSerializer(BatchSerializer):
+    fields = ("id", "name", "tenant_company__legal_name")
+
+    def to_json(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "tenant_company": row["tenant_company__legal_name"],
+        }
+
+
+class ExpenseSerializer(BatchSerializer):
+    fields = (
+        "id",
+        "expense_type__name",
+        "amount",
+        "explanation",
+        "date",
+        "is_approved",
+        "approved_at",
+        "approved_by__first_name",
+        "approved_by__last_name",
+        "approved_by_id",
+        "is_paid",
+        "paid_at",
+        "tenant_company__legal_name",
+    )
+
+    def to_json(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "expense_type": row["expense_type__name"],
+            "amount": row["amount"],
+            "explanation": row["explanation"],
+            "date": format_datetime(row["date"]),
+            "is_approved": row["is_approved"],
+            "approved_at": format_datetime(row["approved_at"]),
+            "approved_by": format_full_name(
+                row["approved_by__first_name"], row["approved_by__last_name"]
+            )
+            if row["approved_by_id"]
+            else "",
+            "is_paid": row["is_paid"],
+            "paid_at": format_datetime(row["paid_at"]),
+            "tenant_company": row["tenant_company__legal_name"],
+        }
@@ -0,0 +1,230 @@
+"""
+Incremental maintenance of the ExpenseSummary table.
+
+Every active, not deleted Expense contributes (1, amount) to the summary row of its key
+    (tenant_company, expense_type, month, is_approved, is_paid)
+where the month is the first day of the month of `date` (of `created_at`, if `date` is empty).
+
+The writes of Expense apply the difference of the contributions to the summary rows
+in the same transaction:
+- The rows written are locked and their contributions read before the write
+  (SELECT ... FOR UPDATE by primary key), so the concurrent writes cannot make
+  the deltas stale.
+- The contributions after the write are computed from the instances for save()
+  and bulk_create(), and aggregated by primary key for update(), bulk_update()
+  and save(update_fields=...).
+- A save() with update_fields that do not affect the summary does not touch it.
+
+`manage.py rebuild_expense_summaries` recomputes the rows from scratch.
+"""
+
+import contextlib
+import contextvars
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+# The Expense fields which the summary depends on.
+SUMMARY_FIELD_NAMES = [
+    "tenant_company",
+    "expense_type",
+    "date",
+    "created_at",
+    "amount",
+    "is_approved",
+    "is_paid",
+    "is_active",
+    "is_deleted",
+]
+SUMMARY_FIELDS = frozenset(
+    [*SUMMARY_FIELD_NAMES, "tenant_company_id", "expense_type_id"]
+)
+# Fields of the ExpenseSummary key.
+KEY_FIELDS = ("tenant_company_id", "expense_type_id", "month", "is_approved", "is_paid")
+
+
+_in_tracked_write = contextvars.ContextVar(
+    "expense_summary_tracked_write", default=False
+)
+
+
+@contextlib.contextmanager
+def tracked_write():
+    """
+    Marks a write whose summary deltas are applied by the caller, so that the writes
+    it runs internally (e.g. QuerySet.bulk_update() runs update()) are not counted again.
+    """
+    token = _in_tracked_write.set(True)
+    try:
+        yield
+    finally:
+        _in_tracked_write.reset(token)
+
+
+def is_tracked_write() -> bool:
+    return _in_tracked_write.get()
+
+
+def _normalize_id(value) -> str:
+    # The ids are either UUIDs or (hex) strings.
+    return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+
+
+def get_summary_month(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date().replace(day=1)
+
+
+def get_contributions(expenses) -> dict:
+    """
+    Returns {key: [count, amount]} of the expense instances.
+    """
+    contributions = defaultdict(lambda: [0, Decimal(0)])
+    for expense in expenses:
+        if not expense.is_active or expense.is_deleted or not expense.tenant_company_id:
+            continue
+        moment = expense.date or expense.created_at
+        if moment is None:
+            continue
+        key = (
+            _normalize_id(expense.tenant_company_id),
+            _normalize_id(expense.expense_type_id),
+            get_summary_month(moment),
+            bool(expense.is_approved),
+            bool(expense.is_paid),
+        )
+        contributions[key][0] += 1
+        contributions[key][1] += Decimal(expense.amount or 0)
+    return dict(contributions)
+
+
+def lock_contributions(queryset) -> dict:
+    """
+    Locks the rows of an Expense queryset until the end of the transaction and
+    returns their contributions.
+    """
+    return get_contributions(
+        queryset.select_for_update().only(*SUMMARY_FIELD_NAMES).order_by("pk")
+    )
+
+
+def aggregate_contributions(queryset) -> dict:
+    """
+    Returns {key: [count, amount]} of the rows of an Expense queryset.
+    """
+    rows = (
+        queryset.filter(is_active=True, is_deleted=False, tenant_company__isnull=False)
+        .annotate(
+            month=TruncMonth(Coalesce("date", "created_at"), output_field=DateField())
+        )
+        .values(*KEY_FIELDS)
+        .annotate(expense_count=Count("id"), total_amount=Sum("amount"))
+        .order_by()
+    )
+    return {
+        (
+            _normalize_id(row["tenant_company_id"]),
+            _normalize_id(row["expense_type_id"]),
+            row["month"],
+            row["is_approved"],
+            row["is_paid"],
+        ): [row["expense_count"], Decimal(row["total_amount"] or 0)]
+        for row in rows
+    }
+
+
+def get_deltas(after, before) -> dict:
+    """
+    Returns {key: [count, amount]} to add to the summary rows, for the contributions
+    of the written rows before and after the write.
+    """
+    deltas = {}
+    for key in set(after) | set(before):
+        count_after, amount_after = after.get(key, [0, Decimal(0)])
+        count_before, amount_before = before.get(key, [0, Decimal(0)])
+        if (count_after, amount_after) != (count_before, amount_before):
+            deltas[key] = [count_after - count_before, amount_after - amount_before]
+    return deltas
+
+
+def apply_deltas(deltas, using="default"):
+    """
+    Adds the deltas to the summary rows with one upsert statement.
+    Must be called in the transaction of the Expense write.
+    """
+    if not deltas:
+        return
+    from company.models import ExpenseSummary
+
+    connection = connections[using]
+    opts = ExpenseSummary._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    fields = [opts.get_field(x) for x in KEY_FIELDS] + [
+        opts.get_field("expense_count"),
+        opts.get_field("total_amount"),
+    ]
+    columns = [qn(field.column) for field in fields]
+    key_columns = ", ".join(columns[: len(KEY_FIELDS)])
+
+    values_sql = []
+    params = []
+    # Sorted, so that the concurrent writes lock the summary rows in the same order.
+    for key, (count, amount) in sorted(deltas.items(), key=lambda x: repr(x[0])):
+        values_sql.append(f"({', '.join(['%s'] * len(fields))})")
+        params += [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(fields, [*key, count, amount])
+        ]
+
+    count_column, amount_column = columns[-2:]
+    sql = f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES {", ".join(values_sql)}
+        ON CONFLICT ({key_columns}) DO UPDATE SET
+        {count_column} = {table}.{count_column} + EXCLUDED.{count_column},
+        {amount_column} = {table}.{amount_column} + EXCLUDED.{amount_column}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rebuild_summaries(
+    expense_model, summary_model, tenant_company_id=None, using="default"
+):
+    """
+    Recomputes the summary rows (of a tenant) from the expenses. On PostgreSQL the expense
+    table is locked against the writes (SHARE mode) until the rows are rebuilt.
+    """
+    expenses = expense_model._base_manager.db_manager(using).all()
+    summaries = summary_model._base_manager.db_manager(using).all()
+    if tenant_company_id:
+        expenses = expenses.filter(tenant_company_id=tenant_company_id)
+        summaries = summaries.filter(tenant_company_id=tenant_company_id)
+
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(expense_model._meta.db_table)} "
+                    "IN SHARE MODE"
+                )
+        summaries.delete()
+        summary_model._base_manager.db_manager(using).bulk_create(
+            [
+                summary_model(
+                    **dict(zip(KEY_FIELDS, key)),
+                    expense_count=count,
+                    total_amount=amount,
+                )
+                for key, (count, amount) in aggregate_contributions(expenses).items()
+            ],
+            batch_size=1000,
+        )
@@ -1,3 +1,172 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
 
-# Create your tests here.
+from company.models import Expense, ExpenseSummary, ExpenseType
+from company.summary import KEY_FIELDS, aggregate_contributions, rebuild_summaries
+from tenant.tests import TenantTestCase, create_tenant
+
+
+class ExpenseSummaryTests(TenantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.company = create_tenant("tenant_a")
+        cls.other_user, cls.other_company = create_tenant("tenant_b")
+        cls.expense_type = ExpenseType.objects.create(
+            name="Travel", tenant_user=cls.user
+        )
+
+    def create_expenses(self, *amounts, **kwargs):
+        kwargs.setdefault("date", datetime(2026, 1, 15))
+        return Expense.objects.bulk_create(
+            [
+                Expense(expense_type=self.expense_type, amount=amount, **kwargs)
+                for amount in amounts
+            ],
+            tenant_user=self.user,
+        )
+
+    def get_totals(self, *group_by):
+        return [
+            (*[row[x] for x in group_by], row["count"], row["amount"])
+            for row in ExpenseSummary.objects.totals(*group_by, tenant_user=self.user)
+        ]
+
+    def assertSummaryMatchesExpenses(self):
+        summaries = {
+            (
+                str(row["tenant_company_id"]),
+                str(row["expense_type_id"]),
+                row["month"],
+                row["is_approved"],
+                row["is_paid"],
+            ): [row["expense_count"], row["total_amount"]]
+            for row in ExpenseSummary.objects.filter(expense_count__gt=0).values(
+                *KEY_FIELDS, "expense_count", "total_amount"
+            )
+        }
+        self.assertEqual(
+            summaries, aggregate_contributions(Expense._base_manager.all())
+        )
+
+    def test_bulk_create(self):
+        self.create_expenses(10, 20)
+        self.create_expenses(5, date=datetime(2026, 2, 1), is_approved=True)
+
+        self.assertEqual(
+            self.get_totals("month", "is_approved"),
+            [
+                (date(2026, 1, 1), False, 2, Decimal("30.00")),
+                (date(2026, 2, 1), True, 1, Decimal("5.00")),
+            ],
+        )
+        self.assertSummaryMatchesExpenses()
+
+    def test_save(self):
+        expense = Expense(
+            expense_type=self.expense_type, amount=10, date=datetime(2026, 1, 15)
+        )
+        expense.save(user=self.user)
+        self.assertEqual(
+            self.get_totals("month"), [(date(2026, 1, 1), 1, Decimal("10.00"))]
+        )
+
+        expense.amount = 15
+        expense.date = datetime(2026, 2, 15)
+        expense.save(user=self.user)
+
+        self.assertEqual(
+            self.get_totals("month"), [(date(2026, 2, 1), 1, Decimal("15.00"))]
+        )
+        self.assertSummaryMatchesExpenses()
+
+    def test_save_with_update_fields(self):
+        (expense,) = self.create_expenses(10)
+        # A stale value of an unsaved field is not counted.
+        expense.is_paid = True
+        expense.amount = 25
+
+        expense.save(user=self.user, update_fields=["amount"])
+
+        self.assertEqual(self.get_totals("is_paid"), [(False, 1, Decimal("25.00"))])
+        self.assertSummaryMatchesExpenses()
+
+    def test_soft_delete(self):
+        expenses = self.create_expenses(10, 20)
+
+        expenses[0].is_deleted = True
+        expenses[0].save(user=self.user)
+        expenses[1].is_active = False
+        expenses[1].save(user=self.user)
+
+        self.assertEqual(self.get_totals(), [])
+        self.assertSummaryMatchesExpenses()
+
+    def test_update(self):
+        self.create_expenses(10, 20)
+        self.create_expenses(30, date=datetime(2026, 2, 15))
+
+        Expense.objects.filter(
+            tenant_user=self.user, date__lt=datetime(2026, 2, 1)
+        ).update(is_paid=True, tenant_user=self.user)
+
+        self.assertEqual(
+            self.get_totals("month", "is_paid"),
+            [
+                (date(2026, 1, 1), True, 2, Decimal("30.00")),
+                (date(2026, 2, 1), False, 1, Decimal("30.00")),
+            ],
+        )
+        self.assertSummaryMatchesExpenses()
+
+    def test_bulk_update(self):
+        expenses = self.create_expenses(10, 20, 30)
+        expenses[0].amount = 11
+        expenses[1].date = datetime(2026, 3, 1)
+        expenses[2].is_deleted = True
+
+        Expense.objects.bulk_update(
+            expenses, ["amount", "date", "is_deleted"], tenant_user=self.user
+        )
+
+        self.assertEqual(
+            self.get_totals("month"),
+            [
+                (date(2026, 1, 1), 1, Decimal("11.00")),
+                (date(2026, 3, 1), 1, Decimal("20.00")),
+            ],
+        )
+        self.assertSummaryMatchesExpenses()
+
+    def test_delete(self):
+        expenses = self.create_expenses(10, 20, 30, 40)
+
+        expenses[0].delete()
+        Expense.objects.filter(tenant_user=self.user, amount__gte=30).delete(
+            tenant_user=self.user
+        )
+
+        self.assertEqual(self.get_totals(), [(1, Decimal("20.00"))])
+        self.assertSummaryMatchesExpenses()
+
+    def test_totals_are_per_tenant(self):
+        self.create_expenses(10)
+        other_expense_type = ExpenseType.objects.create(
+            name="Travel", tenant_user=self.other_user
+        )
+        Expense.objects.create(
+            expense_type=other_expense_type, amount=99, tenant_user=self.other_user
+        )
+
+        self.assertEqual(self.get_totals(), [(1, Decimal("10.00"))])
+        self.assertSummaryMatchesExpenses()
+
+    def test_rebuild_summaries(self):
+        self.create_expenses(10, 20)
+        self.create_expenses(30, date=datetime(2026, 2, 15), is_paid=True)
+        totals = self.get_totals("month", "is_paid")
+        ExpenseSummary.objects.all().delete()
+
+        rebuild_summaries(Expense, ExpenseSummary, tenant_company_id=self.company.id)
+
+        self.assertEqual(self.get_totals("month", "is_paid"), totals)
+        self.assertSummaryMatchesExpenses()
@@ -14,7 +14,9 @@ from django.utils.translation import gettext as _
 from django.views.decorators.csrf import csrf_exempt
 
 from core.decorators import requires_admin_role, requires_superuser
+from core.pagination import json_list_response
 from company.models import Company, Expense, ExpenseType
+from company.serializers import CompanySerializer, ExpenseSerializer, ExpenseTypeSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -22,27 +24,41 @@ logger = logging.getLogger(__name__)
 @requires_superuser
 def company_list(request):
     companies = Company.objects.filter(is_active=True, is_deleted=False)
-    datas = []
-    for x in companies:
-        datas.append((x._json()))
-    return JsonResponse({"data": datas})
+    ordering = ("legal_name", "id")
+    serializer = CompanySerializer()
+    return json_list_response(
+        request,
+        serializer.get_queryset(companies, extra_fields=ordering),
+        ordering,
+        serializer.to_json,
+    )
 
 @login_required
 def expense_type_list(request):
     user = request.user
 
-    expenses = ExpenseType.objects.filter(tenant_user=user).filter(is_active=True, is_deleted=False)
-    datas = []
-    for x in expenses:
-        datas.append((x._json()))
-    return JsonResponse({"data": datas})
+    expenses = ExpenseType.objects.cached(tenant_user=user).filter(
+        is_active=True, is_deleted=False
+    )
+    ordering = ("name", "id")
+    serializer = ExpenseTypeSerializer()
+    return json_list_response(
+        request,
+        serializer.get_queryset(expenses, extra_fields=ordering),
+        ordering,
+        serializer.to_json,
+    )
 
 @login_required
 def expense_list(request):
     user = request.user
 
     expenses = Expense.objects.filter(tenant_user=user, is_active=True, is_deleted=False)
-    datas = []
-    for x in expenses:
-        datas.append((x._json()))
-    return JsonResponse({"data": datas})
\ No newline at end of file
+    ordering = ("-created_at", "-id")
+    serializer = ExpenseSerializer()
+    return json_list_response(
+        request,
+        serializer.get_queryset(expenses, extra_fields=ordering),
+        ordering,
+        serializer.to_json,
+    )
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from constance.signals import config_updated
+        from django.db.backends.signals import connection_created
+        from core.constance_snapshot import invalidate_snapshot
+        from core.db_router import install_write_tracking
+
+        connection_created.connect(install_write_tracking)
+
+        config_updated.connect(invalidate_snapshot)
@@ -0,0 +1,52 @@
+"""
+Async reads of the default cache for ASGI deployments.
+
+Django's `cache.aget()` runs the sync django-redis client in the thread pool.
+When the default cache is django-redis, the values are read with the asyncio
+client of redis-py instead and decoded by the django-redis client, so the
+keys and the serialization stay the same as `cache.get()`.
+For the other cache backends, it falls back to `cache.aget()`.
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _is_django_redis():
+    return settings.CACHES["default"]["BACKEND"].startswith("django_redis")
+
+
+def get_async_redis():
+    """
+    Returns the asyncio Redis client of the running event loop.
+    The connections of an asyncio client cannot be shared between event loops.
+    """
+    from redis import asyncio as aioredis
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        cache_settings = settings.CACHES["default"]
+        options = cache_settings.get("OPTIONS", {})
+        client = aioredis.Redis.from_url(
+            cache_settings["LOCATION"],
+            password=options.get("PASSWORD") or None,
+            socket_connect_timeout=options.get("SOCKET_CONNECT_TIMEOUT"),
+            socket_timeout=options.get("SOCKET_TIMEOUT"),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aget(key, default=None):
+    if not _is_django_redis():
+        return await cache.aget(key, default)
+    value = await get_async_redis().get(str(cache.client.make_key(key)))
+    if value is None:
+        return default
+    return cache.client.decode(value)
@@ -0,0 +1,129 @@
+"""
+Fans out the invalidations of the in-process caches (LocalCache) over Redis pub/sub.
+
+Every worker process subscribes to CACHE_INVALIDATION_CHANNEL with a daemon thread.
+A published message drops the key from the registered local cache of every process,
+including the publisher. If the subscription is interrupted, the local caches are
+cleared on reconnect since the messages sent in between are lost.
+When the default cache is not Redis, the invalidations are applied locally only.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from sentry_sdk import capture_exception
+
+logger = logging.getLogger(__name__)
+
+_INSTANCE_ID = uuid.uuid4().hex
+_local_caches = {}
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+
+def _sender_id():
+    # Forked workers share _INSTANCE_ID, the pid tells them apart.
+    return f"{_INSTANCE_ID}:{os.getpid()}"
+
+
+def _get_redis_connection():
+    if not settings.CACHES["default"]["BACKEND"].startswith("django_redis"):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def _apply(namespace, key=None):
+    local_cache = _local_caches.get(namespace)
+    if local_cache is None:
+        return
+    if key is None:
+        local_cache.clear()
+    else:
+        local_cache.delete(key)
+
+
+def _clear_all():
+    for local_cache in _local_caches.values():
+        local_cache.clear()
+
+
+def _listen():
+    while True:
+        pubsub = None
+        try:
+            redis_conn = _get_redis_connection()
+            if redis_conn is None:
+                return
+            pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            _clear_all()
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if not message:
+                    continue
+                data = json.loads(message["data"])
+                if data.get("sender") == _sender_id():
+                    continue
+                _apply(data["namespace"], data.get("key"))
+        except Exception as exc:
+            logger.warning("Cache invalidation listener failed: %s", exc)
+            time.sleep(settings.CACHE_INVALIDATION_RETRY_DELAY)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def ensure_listener():
+    """
+    Starts the listener thread once per process (also after a fork, e.g. gunicorn --preload).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        if _get_redis_connection() is None:
+            return
+        thread = threading.Thread(
+            target=_listen, name="cache-invalidation-listener", daemon=True
+        )
+        thread.start()
+
+
+def register(namespace, local_cache):
+    _local_caches[namespace] = local_cache
+
+
+def publish(namespace, key=None):
+    """
+    Invalidates the key (or the whole namespace, if key is None) in every process.
+    """
+    _apply(namespace, key)
+    try:
+        redis_conn = _get_redis_connection()
+        if redis_conn is None:
+            return
+        redis_conn.publish(
+            settings.CACHE_INVALIDATION_CHANNEL,
+            json.dumps(
+                {
+                    "sender": _sender_id(),
+                    "namespace": namespace,
+                    "key": None if key is None else str(key),
+                }
+            ),
+        )
+    except Exception as exc:
+        capture_exception(exc)
@@ -1 +1,10 @@
-SELECTED_TCID_CACHE_KEY = "selected_tenant_cid"
\ No newline at end of file
+SELECTED_TCID_CACHE_KEY = "selected_tenant_cid"
+VALIDATED_TCID_CACHE_KEY = "validated_tenant_cid"
+USER_SESSIONS_CACHE_KEY = "user_sessions"
+TENANT_QUERY_CACHE_KEY = "tenant_query"
+TENANT_QUERY_GEN_CACHE_KEY = "tenant_query_gen"
+USER_PERMISSIONS_CACHE_KEY = "user_permissions"
+USER_PERMISSIONS_VERSION_CACHE_KEY = "user_permissions_version"
+ACCOUNT_INFO_CACHE_KEY = "account_info"
+ACCOUNT_INFO_VERSION_CACHE_KEY = "account_info_version"
+ONBOARDED_USER_CACHE_KEY = "onboarded_user"
@@ -0,0 +1,67 @@
+"""
+In-process snapshot of the constance settings.
+
+`config` is a drop-in replacement of `constance.config` for the reads: every key of
+CONSTANCE_CONFIG is loaded with a single `mget()` of the backend, and kept in the process
+for CONSTANCE_SNAPSHOT_TTL seconds, so the middleware flags cost a dict lookup instead of
+a Redis round-trip per attribute access.
+
+A change (`config_updated`, e.g. from the constance admin) drops the snapshot of every
+process through `cache_invalidation`; the TTL bounds the staleness if a message is lost.
+The writes go to constance itself.
+"""
+
+from constance import config as constance_config
+from constance import settings as constance_settings
+from django.conf import settings
+
+from core import cache_invalidation
+from core.local_cache import LocalCache
+
+SNAPSHOT_NAMESPACE = "constance_snapshot"
+_SNAPSHOT_KEY = "config"
+
+_snapshot_cache = LocalCache(maxsize=1, ttl=settings.CONSTANCE_SNAPSHOT_TTL)
+cache_invalidation.register(SNAPSHOT_NAMESPACE, _snapshot_cache)
+
+
+def load_snapshot() -> dict:
+    """
+    Returns {key: value} of every constance setting, the defaults for the unset ones.
+    """
+    values = {key: options[0] for key, options in constance_settings.CONFIG.items()}
+    values.update(dict(constance_config._backend.mget(list(values)) or ()))
+    return values
+
+
+def get_snapshot() -> dict:
+    cache_invalidation.ensure_listener()
+    snapshot = _snapshot_cache.get(_SNAPSHOT_KEY, None)
+    if snapshot is None:
+        snapshot = load_snapshot()
+        _snapshot_cache.set(_SNAPSHOT_KEY, snapshot)
+    return snapshot
+
+
+def invalidate_snapshot(**kwargs):
+    """
+    Also the `config_updated` receiver of constance.
+    """
+    cache_invalidation.publish(SNAPSHOT_NAMESPACE)
+
+
+class SnapshotConfig:
+    def __getattr__(self, key):
+        snapshot = get_snapshot()
+        if key not in snapshot:
+            raise AttributeError(key)
+        return snapshot[key]
+
+    def __setattr__(self, key, value):
+        setattr(constance_config, key, value)
+
+    def __dir__(self):
+        return constance_settings.CONFIG.keys()
+
+
+config = SnapshotConfig()
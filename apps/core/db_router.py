@@ -0,0 +1,145 @@
+"""
+Read/write routing between the primary ("default") and the read replicas.
+
+- Writes, migrations and the reads in a transaction go to the primary.
+- The other reads go to a replica, chosen once per request with round-robin or
+  least-connections (DB_REPLICA_SELECTION).
+- After a request writes, its later reads use the primary, and so do the
+  requests of that client for DB_PRIMARY_PIN_SECONDS, through a cookie set by
+  the DatabaseRoutingMiddleware. So a page load right after `accountcompany_change`
+  does not read a stale selection from a lagging replica.
+  A write is an INSERT/UPDATE/DELETE executed on the primary (see
+  `write_tracking_execute_wrapper`); the reads routed with `db_for_write()`
+  (get_or_create() lookups, select_for_update()...) do not pin the client.
+  The pin is a cookie of the browser, the other devices/browsers of the same
+  user keep reading the replicas and may see the write only after the replication lag.
+
+Without replicas (DATABASE_REPLICAS is empty), everything uses the primary.
+"""
+
+import contextvars
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_DB_ALIAS = "default"
+PRIMARY_PIN_COOKIE_NAME = "db_primary_pin"
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "MERGE")
+
+_pinned_to_primary = contextvars.ContextVar("db_pinned_to_primary", default=False)
+_has_written = contextvars.ContextVar("db_has_written", default=False)
+_request_replica = contextvars.ContextVar("db_request_replica", default=None)
+
+
+class ReplicaSelector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cycle = None
+        self._cycle_aliases = None
+        self._active = {}
+
+    def get_replicas(self) -> list:
+        return [x for x in settings.DATABASE_REPLICAS if x in settings.DATABASES]
+
+    def acquire(self):
+        """
+        Returns the replica alias for a request, or None if there are no replicas.
+        The alias must be given back with `release()`.
+        """
+        replicas = self.get_replicas()
+        if not replicas:
+            return None
+        with self._lock:
+            if settings.DB_REPLICA_SELECTION == "least_connections":
+                alias = min(replicas, key=lambda x: self._active.get(x, 0))
+            else:
+                if self._cycle_aliases != replicas:
+                    self._cycle = itertools.cycle(replicas)
+                    self._cycle_aliases = replicas
+                alias = next(self._cycle)
+            self._active[alias] = self._active.get(alias, 0) + 1
+        return alias
+
+    def release(self, alias):
+        if alias is None:
+            return
+        with self._lock:
+            self._active[alias] = max(self._active.get(alias, 0) - 1, 0)
+
+
+replica_selector = ReplicaSelector()
+
+
+def mark_written():
+    # The later reads of the request/script must see the write.
+    _has_written.set(True)
+    _pinned_to_primary.set(True)
+
+
+def has_written() -> bool:
+    return _has_written.get()
+
+
+def write_tracking_execute_wrapper(execute, sql, params, many, context):
+    if sql.lstrip()[:6].upper().startswith(_WRITE_STATEMENTS):
+        mark_written()
+    return execute(sql, params, many, context)
+
+
+def install_write_tracking(sender, connection, **kwargs):
+    """
+    `connection_created` receiver, tracks the writes executed on the primary.
+    """
+    if connection.alias != PRIMARY_DB_ALIAS:
+        return
+    if write_tracking_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, write_tracking_execute_wrapper)
+
+
+def get_read_db_alias() -> str:
+    if _pinned_to_primary.get() or connections[PRIMARY_DB_ALIAS].in_atomic_block:
+        return PRIMARY_DB_ALIAS
+    alias = _request_replica.get()
+    if alias is None:
+        # Outside of a request, e.g. management commands.
+        replicas = replica_selector.get_replicas()
+        alias = replicas[0] if replicas else PRIMARY_DB_ALIAS
+    return alias
+
+
+def start_request(pinned=False):
+    """
+    Returns a token for `end_request()`.
+    """
+    replica = replica_selector.acquire()
+    return (
+        replica,
+        _request_replica.set(replica),
+        _pinned_to_primary.set(pinned),
+        _has_written.set(False),
+    )
+
+
+def end_request(token):
+    replica, replica_token, pinned_token, written_token = token
+    _request_replica.reset(replica_token)
+    _pinned_to_primary.reset(pinned_token)
+    _has_written.reset(written_token)
+    replica_selector.release(replica)
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        return get_read_db_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB_ALIAS
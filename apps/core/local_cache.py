@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from core import async_cache, cache_invalidation
+from core.metrics import record_cache_access
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    Thread-safe, in-process LRU cache with a time-to-live per entry.
+    Every worker process has its own copy, so the entries must be either short-lived
+    or invalidated explicitly.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Incremented by every delete/clear, see `set(..., if_version=...)`.
+        self.version = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, if_version=None):
+        """
+        With `if_version`, the value is only stored if nothing was invalidated since
+        `version` was read, so a value read before an invalidation is not cached after it.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if if_version is not None and if_version != self.version:
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self.version += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    LocalCache (L1) in front of the Django cache (L2).
+
+    Reads are answered from the process memory when possible; writes and deletes go to both tiers
+    and drop the key from the L1 of the other processes via `cache_invalidation`.
+    The keys are prefixed, so `cache.get(f"{prefix}_{key}")` reads the same L2 entry.
+    """
+
+    def __init__(self, prefix, timeout=None, local_ttl=30, local_maxsize=1024):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.local = LocalCache(maxsize=local_maxsize, ttl=local_ttl)
+        cache_invalidation.register(self.prefix, self.local)
+
+    def make_key(self, key):
+        return f"{self.prefix}_{key}"
+
+    def get(self, key, default=None):
+        cache_invalidation.ensure_listener()
+        key = str(key)
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            record_cache_access(hit=True)
+            return value
+        # An invalidation received while L2 is read must not be overwritten by the old value.
+        local_version = self.local.version
+        value = cache.get(self.make_key(key), _MISSING)
+        record_cache_access(hit=value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self.local.set(key, value, if_version=local_version)
+        return value
+
+    async def aget(self, key, default=None):
+        """
+        Async counterpart of `get()`, the L2 is read with the asyncio Redis client.
+        """
+        cache_invalidation.ensure_listener()
+        key = str(key)
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            record_cache_access(hit=True)
+            return value
+        local_version = self.local.version
+        value = await async_cache.aget(self.make_key(key), _MISSING)
+        record_cache_access(hit=value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self.local.set(key, value, if_version=local_version)
+        return value
+
+    def set(self, key, value, timeout=_MISSING):
+        key = str(key)
+        timeout = self.timeout if timeout is _MISSING else timeout
+        cache.set(self.make_key(key), value, timeout=timeout)
+        cache_invalidation.publish(self.prefix, key)
+        self.local.set(key, value)
+
+    def delete(self, key):
+        key = str(key)
+        cache.delete(self.make_key(key))
+        cache_invalidation.publish(self.prefix, key)
+
+    async def aset(self, key, value, timeout=_MISSING):
+        # The writes are rare, they go through the sync client and the invalidation publisher.
+        await sync_to_async(self.set)(key, value, timeout)
@@ -0,0 +1,132 @@
+"""
+Batched, asynchronous request log sink for the LoggingMiddleware.
+
+The middleware appends a record to an in-memory ring buffer, which costs a
+deque append. A daemon thread per process drains the buffer every
+REQUEST_LOG_FLUSH_INTERVAL seconds (or as soon as REQUEST_LOG_BATCH_SIZE
+records are waiting) and hands the batch to the configured sink.
+When the sink cannot keep up, the oldest records are dropped instead of
+slowing down the requests.
+
+The sink is selected with REQUEST_LOG_SINK (a dotted path); any class with a
+`write(records)` method can be plugged in.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+from sentry_sdk import capture_exception
+
+logger = logging.getLogger(__name__)
+
+
+class LoggerSink:
+    """
+    Writes every record as one JSON line to the `request_log` logger.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("request_log")
+
+    def write(self, records):
+        for record in records:
+            self.logger.info(json.dumps(record, cls=DjangoJSONEncoder))
+
+
+class JSONLFileSink:
+    """
+    Appends the records to REQUEST_LOG_FILE, one JSON document per line.
+    """
+
+    def __init__(self):
+        self.path = settings.REQUEST_LOG_FILE
+
+    def write(self, records):
+        lines = "".join(
+            json.dumps(record, cls=DjangoJSONEncoder) + "\n" for record in records
+        )
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class RequestLogBuffer:
+    def __init__(self, maxsize, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped_count = 0
+        self._records = deque(maxlen=maxsize)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker_pid = None
+        self._sink = None
+
+    def get_sink(self):
+        if self._sink is None:
+            self._sink = import_string(settings.REQUEST_LOG_SINK)()
+        return self._sink
+
+    def append(self, record):
+        self._ensure_worker()
+        if len(self._records) == self._records.maxlen:
+            # The deque discards the oldest record.
+            self.dropped_count += 1
+        self._records.append(record)
+        if len(self._records) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            while self._records:
+                batch = []
+                while self._records and len(batch) < self.batch_size:
+                    batch.append(self._records.popleft())
+                try:
+                    self.get_sink().write(batch)
+                except Exception as exc:
+                    capture_exception(exc)
+
+            if self.dropped_count:
+                logger.warning(
+                    "Request log buffer was full, %s records were dropped.",
+                    self.dropped_count,
+                )
+                self.dropped_count = 0
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_worker(self):
+        """
+        Starts the flush thread once per process (also after a fork, e.g. gunicorn --preload).
+        """
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            thread = threading.Thread(
+                target=self._run, name="request-log-flusher", daemon=True
+            )
+            thread.start()
+
+
+request_log_buffer = RequestLogBuffer(
+    maxsize=settings.REQUEST_LOG_BUFFER_SIZE,
+    batch_size=settings.REQUEST_LOG_BATCH_SIZE,
+    flush_interval=settings.REQUEST_LOG_FLUSH_INTERVAL,
+)
+
+# The records still in the buffer are written when the worker process exits.
+atexit.register(request_log_buffer.flush)
@@ -0,0 +1,189 @@
+"""
+In-process request metrics per view and tenant, exposed in the Prometheus text format.
+
+The MetricsMiddleware (tenantisolation.middleware) measures every request
+(wall time, number and time of the DB queries, TwoTierCache hits/misses,
+response size) and aggregates them into histograms labelled with the view
+name and the tenant company id.
+Quantiles (p50/p99) are computed by the scraper, e.g.
+    histogram_quantile(0.99, sum by (tenant, le) (rate(http_request_duration_seconds_bucket[5m])))
+
+Every worker process keeps its own registry, so each process has to be scraped
+(or the numbers of a single process are a sample of the whole).
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connections
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda x: x[0])
+            counters = sorted(self._counters.items(), key=lambda x: x[0])
+
+        previous_name = None
+        for (name, labels), histogram in histograms:
+            if name != previous_name:
+                lines.append(f"# TYPE {name} histogram")
+                previous_name = name
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}"
+                )
+            lines.append(
+                f"{name}_bucket{_format_labels(labels, le='+Inf')} {histogram.count}"
+            )
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        previous_name = None
+        for (name, labels), value in counters:
+            if name != previous_name:
+                lines.append(f"# TYPE {name} counter")
+                previous_name = name
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, **extra) -> str:
+    items = [*labels, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items) + "}"
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_time += time.perf_counter() - started_at
+
+
+def record_cache_access(hit):
+    """
+    Counts a cache hit/miss for the current request, if it is measured.
+    """
+    stats = _current_request_stats.get()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+@contextlib.contextmanager
+def measure_request():
+    """
+    Collects the RequestStats of the block: the queries of every database
+    connection and the cache accesses reported with `record_cache_access`.
+    """
+    stats = RequestStats()
+    token = _current_request_stats.set(stats)
+    wrapped_connections = []
+    try:
+        for connection in connections.all():
+            connection.execute_wrappers.append(stats.execute_wrapper)
+            wrapped_connections.append(connection)
+        yield stats
+    finally:
+        # Removed by identity: the other wrappers (e.g. tenant.rls) may have been
+        # added after this one, so the last item is not necessarily ours.
+        for connection in wrapped_connections:
+            try:
+                connection.execute_wrappers.remove(stats.execute_wrapper)
+            except ValueError:
+                pass
+        _current_request_stats.reset(token)
+
+
+def record_request(view, tenant, status_code, duration, stats, response_size=None):
+    labels = (("view", view), ("tenant", tenant))
+    registry.observe(
+        "http_request_duration_seconds", labels, duration, DURATION_BUCKETS
+    )
+    registry.observe(
+        "http_request_db_queries", labels, stats.query_count, QUERY_COUNT_BUCKETS
+    )
+    registry.observe(
+        "http_request_db_duration_seconds", labels, stats.query_time, DURATION_BUCKETS
+    )
+    if response_size is not None:
+        registry.observe(
+            "http_response_size_bytes", labels, response_size, SIZE_BUCKETS
+        )
+    if stats.cache_hits:
+        registry.increment("cache_hits_total", labels, stats.cache_hits)
+    if stats.cache_misses:
+        registry.increment("cache_misses_total", labels, stats.cache_misses)
+    registry.increment("http_responses_total", (*labels, ("status", status_code)))
@@ -0,0 +1,245 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.translation import gettext as _
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates the microseconds, which would skip rows on the page boundaries.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), cls=CursorJSONEncoder)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        assert isinstance(values, list)
+    except Exception:
+        raise ValueError(_("Invalid cursor."))
+    return values
+
+
+def _get_ordering_values(obj, ordering) -> list:
+    # The objects are either model instances or values() rows.
+    if isinstance(obj, dict):
+        return [obj[field.lstrip("-")] for field in ordering]
+    return [getattr(obj, field.lstrip("-")) for field in ordering]
+
+
+def keyset_filter(queryset, ordering, values):
+    """
+    Returns the rows after `values` in the given ordering, e.g. for ("-created_at", "-id"):
+    created_at < x OR (created_at = x AND id < y)
+    The last field of the ordering must be unique.
+    """
+    assert len(ordering) == len(values), _("Invalid cursor.")
+    condition = Q()
+    equals = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= Q(**equals, **{f"{name}__{lookup}": value})
+        equals[name] = value
+    return queryset.filter(condition)
+
+
+def keyset_paginate(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Returns (objects, next_cursor). next_cursor is None on the last page.
+    Unlike OFFSET pagination, every page costs the same index range scan.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = keyset_filter(queryset, ordering, decode_cursor(cursor))
+    objects = list(queryset[: limit + 1])
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = encode_cursor(_get_ordering_values(objects[-1], ordering))
+    return objects, next_cursor
+
+
+def iterate_in_chunks(queryset, ordering, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterates over the queryset with keyset-paginated queries of `chunk_size` rows,
+    so that only one chunk is held in memory at a time.
+    Server-side cursors are disabled (DISABLE_SERVER_SIDE_CURSORS), hence the chunking.
+    """
+    values = None
+    while True:
+        chunk_qs = queryset.order_by(*ordering)
+        if values is not None:
+            chunk_qs = keyset_filter(chunk_qs, ordering, values)
+        chunk = list(chunk_qs[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        values = _get_ordering_values(chunk[-1], ordering)
+
+
+async def akeyset_paginate(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Async counterpart of `keyset_paginate()`.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = keyset_filter(queryset, ordering, decode_cursor(cursor))
+    objects = [x async for x in queryset[: limit + 1]]
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = encode_cursor(_get_ordering_values(objects[-1], ordering))
+    return objects, next_cursor
+
+
+async def aiterate_in_chunks(queryset, ordering, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Async counterpart of `iterate_in_chunks()`.
+    """
+    values = None
+    while True:
+        chunk_qs = queryset.order_by(*ordering)
+        if values is not None:
+            chunk_qs = keyset_filter(chunk_qs, ordering, values)
+        chunk = [x async for x in chunk_qs[:chunk_size]]
+        for obj in chunk:
+            yield obj
+        if len(chunk) < chunk_size:
+            return
+        values = _get_ordering_values(chunk[-1], ordering)
+
+
+def _stream_json(queryset, ordering, serialize):
+    yield '{"data": ['
+    for index, obj in enumerate(iterate_in_chunks(queryset, ordering)):
+        row = json.dumps(serialize(obj), cls=DjangoJSONEncoder)
+        yield row if index == 0 else "," + row
+    yield "]}"
+
+
+async def _astream_json(queryset, ordering, serialize):
+    yield '{"data": ['
+    index = 0
+    async for obj in aiterate_in_chunks(queryset, ordering):
+        row = json.dumps(serialize(obj), cls=DjangoJSONEncoder)
+        yield row if index == 0 else "," + row
+        index += 1
+    yield "]}"
+
+
+def _get_limit(request):
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def json_list_response(request, queryset, ordering, serialize):
+    """
+    Serves the queryset as {"data": [...]} in one of the three modes:
+        ?stream=1               -> every row, streamed in chunks
+        ?limit=N[&cursor=C]     -> a page, plus "next_cursor" for the next one
+        (no parameters)         -> every row in one response
+    """
+    get = request.GET
+    if get.get("stream") in ("1", "true"):
+        return StreamingHttpResponse(
+            _stream_json(queryset, ordering, serialize),
+            content_type="application/json",
+        )
+
+    if "limit" in get or "cursor" in get:
+        try:
+            objects, next_cursor = keyset_paginate(
+                queryset, ordering, cursor=get.get("cursor"), limit=_get_limit(request)
+            )
+        except (ValueError, AssertionError, ValidationError) as exc:
+            return JsonResponse({"result": False, "message": str(exc)}, status=400)
+        return JsonResponse(
+            {"data": [serialize(x) for x in objects], "next_cursor": next_cursor}
+        )
+
+    return JsonResponse({"data": [serialize(x) for x in queryset]})
+
+
+async def ajson_list_response(request, queryset, ordering, serialize):
+    """
+    Async counterpart of `json_list_response()`, for async views.
+    The streaming mode needs an ASGI server, WSGI servers consume the stream synchronously.
+    """
+    get = request.GET
+    if get.get("stream") in ("1", "true"):
+        return StreamingHttpResponse(
+            _astream_json(queryset, ordering, serialize),
+            content_type="application/json",
+        )
+
+    if "limit" in get or "cursor" in get:
+        try:
+            objects, next_cursor = await akeyset_paginate(
+                queryset, ordering, cursor=get.get("cursor"), limit=_get_limit(request)
+            )
+        except (ValueError, AssertionError, ValidationError) as exc:
+            return JsonResponse({"result": False, "message": str(exc)}, status=400)
+        return JsonResponse(
+            {"data": [serialize(x) for x in objects], "next_cursor": next_cursor}
+        )
+
+    return JsonResponse({"data": [serialize(x) async for x in queryset]})
+
+
+def estimate_count(queryset):
+    """
+    Returns the number of rows of the queryset estimated by the PostgreSQL planner
+    (from the table statistics, e.g. the row counts of the most common tenants),
+    or None on the other database backends.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+    except Exception:
+        return None
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner estimate instead of COUNT(*) for the large querysets.
+    The querysets estimated below `threshold` rows are counted exactly.
+    """
+
+    def __init__(self, *args, threshold=ESTIMATED_COUNT_THRESHOLD, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.threshold:
+            return super().count
+        self.is_estimated = True
+        return estimate
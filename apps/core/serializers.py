@@ -0,0 +1,34 @@
+class BatchSerializer:
+    """
+    Serializes querysets with a single `values()` query, instead of calling `_json()` per object
+    (which lazily fetches every related object it touches, i.e. N+1 queries).
+
+    `fields` lists the columns, including the related ones (e.g. "company__legal_name"),
+    and `to_json()` builds the same dict as the model's `_json()` from a row of them.
+    """
+
+    fields = ()
+
+    def get_queryset(self, queryset, extra_fields=()):
+        # extra_fields may be an ordering, e.g. ("-created_at", "-id").
+        fields = list(self.fields)
+        for field in extra_fields:
+            field = field.lstrip("-")
+            if field not in fields:
+                fields.append(field)
+        return queryset.values(*fields)
+
+    def to_json(self, row) -> dict:
+        raise NotImplementedError
+
+    def serialize(self, queryset) -> list:
+        return [self.to_json(row) for row in self.get_queryset(queryset)]
+
+
+def format_datetime(value) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def format_full_name(first_name, last_name) -> str:
+    # Same as User.get_full_name()
+    return ("%s %s" % (first_name or "", last_name or "")).strip()
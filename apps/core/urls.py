@@ -2,5 +2,5 @@ from django.urls import path
 from core import views
 
 urlpatterns = [
-    
+    path("metrics/", views.metrics, name="metrics"),
 ]
\ No newline at end of file
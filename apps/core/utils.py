@@ -1,6 +1,24 @@
+from contextlib import contextmanager
+
+
 def conn_replica(connections):
-    if "replica" in connections:
-        cursor = connections["replica"].cursor()
-    else:
-        cursor = connections["default"].cursor()
+    # The replica is chosen by core.db_router, the primary is used after a write.
+    from core.db_router import get_read_db_alias
+
+    cursor = connections[get_read_db_alias()].cursor()
     return cursor
+
+
+@contextmanager
+def replica_cursor(connections):
+    """
+    Context-manager variant of `conn_replica`, the cursor is closed when the block exits:
+        with replica_cursor(connections) as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    """
+    cursor = conn_replica(connections)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
@@ -5,7 +5,8 @@ from django.core.cache import cache
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.utils.translation import gettext_lazy as _, get_language
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.db.models import Q, F
 
 
@@ -21,6 +22,15 @@ def home(request):
     return render(request, "core/welcome.html", context)
 
 
+@staff_member_required
+def metrics(request):
+    from core.metrics import registry
+
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 def error_404(request, exception=None):
     return render(request, "error_404.html", status=404)
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NativeAccountConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'native_account'
+
+    def ready(self):
+        from native_account import sessions  # noqa: F401 (connects the login/logout receivers)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:24
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built without locking the tables against writes.
+    atomic = False
+
+    dependencies = [
+        ('company', '0003_expense_expense_tc_act_idx_and_more'),
+        ('native_account', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='accountcompany',
+            index=models.Index(fields=['account', 'is_selected'], name='accountcompany_acc_sel_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='accountcompany',
+            index=models.Index(fields=['company', 'is_active', 'is_deleted'], name='accountcompany_cmp_act_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='accountcompany',
+            index=models.Index(fields=['company', 'role'], name='accountcompany_cmp_role_idx'),
+        ),
+    ]
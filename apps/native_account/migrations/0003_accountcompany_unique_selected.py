@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:27
+
+import django.contrib.postgres.constraints
+import django.db.models.constraints
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+def release_duplicate_selections(apps, schema_editor):
+    # Concurrent switches could leave more than one selected company per account,
+    # only the most recently updated one is kept.
+    AccountCompany = apps.get_model("native_account", "AccountCompany")
+    kept_account_ids = set()
+    duplicate_ids = []
+    for ac_id, account_id in (
+        AccountCompany.objects.filter(is_selected=True)
+        .order_by("account_id", models.F("updated_at").desc(nulls_last=True), "-created_at")
+        .values_list("id", "account_id")
+    ):
+        if account_id in kept_account_ids:
+            duplicate_ids.append(ac_id)
+        kept_account_ids.add(account_id)
+    AccountCompany.objects.filter(id__in=duplicate_ids).update(is_selected=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0003_expense_expense_tc_act_idx_and_more'),
+        ('native_account', '0002_accountcompany_accountcompany_acc_sel_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(release_duplicate_selections, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='accountcompany',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('is_selected', True)), deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], expressions=[('account', '=')], name='unique_selected_accountcompany', violation_error_message='Only one company can be selected per account.'),
+        ),
+    ]
@@ -3,22 +3,44 @@ import uuid
 from datetime import datetime
 from typing import Union
 
-from core.utils import conn_replica
+from core.utils import replica_cursor
 from constance import config as constance_config
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import RangeOperators
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMultiAlternatives
-from django.db import models, transaction, connections
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction, connections
+from django.db.models import (
+    Case,
+    Deferrable,
+    Exists,
+    ExpressionWrapper,
+    OuterRef,
+    Q,
+    Subquery,
+    When,
+)
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from sentry_sdk import capture_exception
 
 from core.enums import CoreIntegerChoices
 from core.models import CoreModel
 from company.models import Company
+from tenant.context import (
+    get_current_tenant_context,
+    invalidate_account_info,
+    invalidate_tenant_context,
+)
+from tenant.caches import (
+    onboarded_user_cache,
+    selected_tenant_cache,
+    validated_tenant_cache,
+)
 
 
 class RoleChoices(CoreIntegerChoices):
@@ -26,6 +48,7 @@ class RoleChoices(CoreIntegerChoices):
     ADMIN = 1, _("Admin")
     MEMBER = 2, _("Member")
 
+
 class Account(CoreModel):
     CACHE_KEY = "account"
     EMAIL_VERIFICATION_CACHE_KEY = "account_email_verification"
@@ -80,12 +103,190 @@ class Account(CoreModel):
 
 class AccountCompanyQuerySet(models.QuerySet):
     def delete(self):
-        count = 0
-        with transaction.atomic():
-            for instance in self:
-                instance.delete()
-                count += 1
-        return count
+        """
+        Set-based equivalent of calling `.delete()` on every instance.
+
+        For every account which lost a row, the newest remaining AccountCompany is
+        re-saved by its account user (as `.save()` followed by `.clean()` would do), so the
+        account gets a selected company again if that row is active. The caches and the
+        sessions of the affected users are invalidated in bulk.
+        """
+        with transaction.atomic(using=self.db):
+            rows = list(
+                self.values_list(
+                    "id", "account_id", "account__user_id", "company_id", "is_selected"
+                )
+            )
+            if not rows:
+                return 0
+            super(
+                AccountCompanyQuerySet,
+                self.model.objects.filter(id__in=[row[0] for row in rows]),
+            ).delete()
+
+            account_ids = {row[1] for row in rows}
+            user_ids = {row[2] for row in rows}
+            company_ids = {row[3] for row in rows}
+            unselected_user_ids = {row[2] for row in rows if row[4]}
+
+            try:
+                # A savepoint, so that a failed reselection does not abort the delete.
+                with transaction.atomic(using=self.db):
+                    next_selected = self._reselect_next_account_companies(account_ids)
+            except Exception as exc:
+                capture_exception(exc)
+                next_selected = []
+
+        try:
+            from native_account.permissions import invalidate_user_permissions
+
+            for user_id in user_ids:
+                invalidate_tenant_context(user_id)
+                invalidate_user_permissions(user_id)
+            invalidate_account_info(user_ids)
+            for user_id in unselected_user_ids:
+                selected_tenant_cache.delete(user_id)
+            # The users left without a selected company are not onboarded anymore.
+            for user_id in unselected_user_ids - {x[0] for x in next_selected}:
+                onboarded_user_cache.delete(user_id)
+            for user_id, company_id in next_selected:
+                selected_tenant_cache.set(user_id, company_id)
+            for company_id in company_ids:
+                validated_tenant_cache.delete(str(company_id))
+
+            from native_account.sessions import revoke_user_sessions
+
+            revoke_user_sessions(user_ids)
+        except Exception as exc:
+            capture_exception(exc)
+        return len(rows)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def switch_selected(self, user, company_id) -> int:
+        """
+        Selects the company for the account of the user and releases the previously
+        selected one with a single statement:
+        UPDATE ... SET is_selected = (company_id = X)
+        WHERE account = A AND (is_selected OR company_id = X) AND <X is an active membership of A>
+
+        The unique_selected_accountcompany constraint is checked at the end of the statement,
+        so a concurrent switch of the same account fails instead of leaving two selected rows.
+        That switch is retried once, so the last one wins.
+        """
+        assert user, _("User parameter is missing.")
+        assert company_id, _("Tenant Company ID is missing.")
+        target_exists = Exists(
+            AccountCompany.objects.filter(
+                account_id=OuterRef("account_id"),
+                company_id=company_id,
+                is_active=True,
+                is_deleted=False,
+            )
+        )
+        queryset = self.filter(account__user_id=user.id).filter(
+            Q(is_selected=True) | Q(company_id=company_id), target_exists
+        )
+        for attempt in range(2):
+            try:
+                with transaction.atomic(using=self.db):
+                    updated_count = queryset.update(
+                        is_selected=ExpressionWrapper(
+                            Q(company_id=company_id), output_field=models.BooleanField()
+                        ),
+                        updated_by=user,
+                        updated_at=timezone.now(),
+                    )
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+        assert updated_count, _("Company not found.")
+
+        invalidate_tenant_context(user.id)
+        invalidate_account_info([user.id])
+        selected_tenant_cache.set(user.id, company_id)
+        return updated_count
+
+    switch_selected.alters_data = True
+
+    def _reselect_next_account_companies(self, account_ids) -> list:
+        """
+        Returns the (user_id, company_id) pairs of the newly selected AccountCompany objects.
+        """
+        newest_ids = (
+            AccountCompany.objects.filter(account_id=OuterRef("account_id"))
+            .order_by("-created_at")
+            .values("id")[:1]
+        )
+        next_rows = list(
+            AccountCompany.objects.filter(
+                account_id__in=account_ids, id=Subquery(newest_ids)
+            )
+            .annotate(
+                selected_exists=Exists(
+                    AccountCompany.objects.filter(
+                        account_id=OuterRef("account_id"), is_selected=True
+                    ).exclude(id=OuterRef("id"))
+                ),
+                other_owner_exists=Exists(
+                    AccountCompany.objects.filter(
+                        company_id=OuterRef("company_id"), role=RoleChoices.OWNER
+                    ).exclude(id=OuterRef("id"))
+                ),
+            )
+            .values_list(
+                "id",
+                "account__user_id",
+                "company_id",
+                "is_selected",
+                "is_active",
+                "is_deleted",
+                "role",
+                "selected_exists",
+                "other_owner_exists",
+            )
+        )
+
+        saved_ids, select_ids, unselect_ids, next_selected = [], [], [], []
+        for (
+            ac_id,
+            user_id,
+            company_id,
+            is_selected,
+            is_active,
+            is_deleted,
+            role,
+            selected_exists,
+            other_owner_exists,
+        ) in next_rows:
+            # .clean() raises a ValidationError for these, so they are not saved.
+            if role == RoleChoices.OWNER and other_owner_exists:
+                continue
+            saved_ids.append(ac_id)
+            if is_active and not is_deleted:
+                if not is_selected and not selected_exists:
+                    select_ids.append(ac_id)
+                    next_selected.append((user_id, company_id))
+            elif is_selected:
+                unselect_ids.append(ac_id)
+
+        if saved_ids:
+            AccountCompany.objects.filter(id__in=saved_ids).update(
+                is_selected=Case(
+                    When(id__in=select_ids, then=True),
+                    When(id__in=unselect_ids, then=False),
+                    default="is_selected",
+                ),
+                updated_by_id=Subquery(
+                    Account.objects.filter(id=OuterRef("account_id")).values("user_id")[
+                        :1
+                    ]
+                ),
+                updated_at=timezone.now(),
+            )
+        return next_selected
 
 
 class AccountCompanyManager(models.Manager):
@@ -95,6 +296,9 @@ class AccountCompanyManager(models.Manager):
     def delete(self):
         return self.get_queryset().delete()
 
+    def switch_selected(self, user, company_id) -> int:
+        return self.get_queryset().switch_selected(user, company_id)
+
 
 class AccountCompany(CoreModel):
     CACHE_KEY = "account_company"
@@ -118,7 +322,37 @@ class AccountCompany(CoreModel):
             models.UniqueConstraint(
                 fields=["account", "company"],
                 name="unique_accountcompany",
-            )
+            ),
+            # One selected company per account. A partial unique index cannot be deferred,
+            # so the same rule is declared as an exclusion constraint (btree_gist) that is
+            # checked at the end of each statement. This lets switch_selected() swap the
+            # selection with a single UPDATE.
+            ExclusionConstraint(
+                name="unique_selected_accountcompany",
+                expressions=[("account", RangeOperators.EQUAL)],
+                condition=Q(is_selected=True),
+                deferrable=Deferrable.IMMEDIATE,
+                violation_error_message=_(
+                    "Only one company can be selected per account."
+                ),
+            ),
+        ]
+        indexes = [
+            # Selected company of an account.
+            models.Index(
+                fields=["account", "is_selected"],
+                name="accountcompany_acc_sel_idx",
+            ),
+            # Active members of a company (get_isolated_account_ids).
+            models.Index(
+                fields=["company", "is_active", "is_deleted"],
+                name="accountcompany_cmp_act_idx",
+            ),
+            # Owner/admin lookups of a company.
+            models.Index(
+                fields=["company", "role"],
+                name="accountcompany_cmp_role_idx",
+            ),
         ]
         ordering = ["-created_at"]
 
@@ -132,42 +366,55 @@ class AccountCompany(CoreModel):
             "role_trans": self.get_role_display(),
         }
 
-    def clean(self):
-        selected_exists = (
-            AccountCompany.objects.filter(account=self.account, is_selected=True)
-            .exclude(id=self.id)
-            .exists()
-        )
-        selected_qs = AccountCompany.objects.filter(
-            account=self.account, is_selected=True
-        ).exclude(id=self.id)
+    def get_constraints(self):
+        # save() releases the previously selected company, so model/form validation
+        # does not reject selecting another one.
+        return [
+            (
+                model_class,
+                [x for x in constraints if x.name != "unique_selected_accountcompany"],
+            )
+            for model_class, constraints in super().get_constraints()
+        ]
 
-        if self.is_active and not self.is_deleted:
-            if self.is_selected:
-                if selected_exists:
-                    # An AccountCompany with 'is_selected=True' already exists.
-                    selected_qs.update(is_selected=False)
-            elif not self.is_selected:
-                if not selected_exists:
-                    # There should be at least one object with is_selected=True
-                    self.is_selected = True
-        else:
+    def clean(self):
+        if not self.is_active or self.is_deleted:
             self.is_selected = False
+        elif not self.is_selected:
+            # There should be at least one object with is_selected=True
+            self.is_selected = not (
+                AccountCompany.objects.filter(
+                    account_id=self.account_id, is_selected=True
+                )
+                .exclude(id=self.id)
+                .exists()
+            )
 
         # Check if there's already an owner for this company
-        owner_exists = (
-            AccountCompany.objects.filter(company=self.company, role=RoleChoices.OWNER)
-            .exclude(id=self.id)
-            .exists()
-        )
-
-        if self.role == RoleChoices.OWNER and owner_exists:
-            raise ValidationError(_("Invalid role, please contact with your company"))
+        if self.role == RoleChoices.OWNER:
+            owner_exists = (
+                AccountCompany.objects.filter(
+                    company_id=self.company_id, role=RoleChoices.OWNER
+                )
+                .exclude(id=self.id)
+                .exists()
+            )
+            if owner_exists:
+                raise ValidationError(
+                    _("Invalid role, please contact with your company")
+                )
 
     def save(self, *args, **kwargs):
         self.clean()
         is_initial_save = self._state.adding
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.is_selected:
+                # The previously selected company is released in the same transaction,
+                # the unique_selected_accountcompany constraint is checked at the end of the statement.
+                AccountCompany.objects.filter(
+                    account_id=self.account_id, is_selected=True
+                ).exclude(id=self.id).update(is_selected=False)
+            super().save(*args, **kwargs)
 
         if is_initial_save:
             try:
@@ -176,48 +423,35 @@ class AccountCompany(CoreModel):
             except Exception as exc:
                 capture_exception(exc)
 
-        if self.is_selected:
-            from core.cache_keys import SELECTED_TCID_CACHE_KEY
+        from native_account.permissions import invalidate_user_permissions
 
-            cache.set(
-                f"{SELECTED_TCID_CACHE_KEY}_{self.account.user.id}",
-                self.company_id,
-                timeout=None,
-            )
-
-    def delete(self, *args, **kwargs):
-        user = self.account.user
+        invalidate_tenant_context(self.account.user_id)
+        invalidate_user_permissions(self.account.user_id)
+        invalidate_account_info([self.account.user_id])
+        validated_tenant_cache.delete(str(self.company_id))
         if self.is_selected:
-            from core.cache_keys import SELECTED_TCID_CACHE_KEY
+            selected_tenant_cache.set(self.account.user_id, self.company_id)
+        elif (
+            (not self.is_active or self.is_deleted)
+            and not is_initial_save
+            and not AccountCompany.objects.filter(
+                account_id=self.account_id, is_selected=True
+            ).exists()
+        ):
+            # The account lost its selected company (e.g. the row was deactivated).
+            onboarded_user_cache.delete(self.account.user_id)
 
-            cache.delete(f"{SELECTED_TCID_CACHE_KEY}_{self.account.user.id}")
-        super().delete(*args, **kwargs)
-        try:
-            ac_next = AccountCompany.objects.filter(
-                account=self.account,
-            ).first()
-            if ac_next:
-                """
-                This user is not the one who is performing the deletion process.
-                However, it will be used in .save() because we don't have the specified parameter.
-                Note that the .save() will trigger the .clean().
-                """
-                ac_next.save(user=user)
-            with transaction.atomic():
-                from django.contrib.sessions.models import Session
-
-                for session in Session.objects.all():
-                    data = session.get_decoded()
-                    if str(user.id) == data.get("_auth_user_id"):
-                        session.delete()
-        except Exception as exc:
-            capture_exception(exc)
+    def delete(self, *args, **kwargs):
+        # See AccountCompanyQuerySet.delete() for the side effects.
+        return self.__class__.objects.filter(id=self.id).delete()
 
     @classmethod
     def get_selected_tenant_company_id(cls, user=None) -> Union[str, None]:
         assert user, _("User parameter is missing.")
+        tenant_context = get_current_tenant_context(user)
+        if tenant_context is not None:
+            return tenant_context.company_id
         try:
-            cursor = conn_replica(connections)
             sql = """
                 SELECT company_id
                 FROM native_account_accountcompany ac
@@ -226,8 +460,9 @@ class AccountCompany(CoreModel):
                 WHERE au.id = %s and ac.is_selected = true
                 LIMIT 1
             """
-            cursor.execute(sql, [user.id])
-            row = cursor.fetchone()
+            with replica_cursor(connections) as cursor:
+                cursor.execute(sql, [user.id])
+                row = cursor.fetchone()
             selected_company_id = str(row[0]) if row else None
             """
             ORM Version for Future Reference
@@ -262,7 +497,6 @@ class AccountCompany(CoreModel):
                         AND (ac.role = %s OR ac.role = %s)
                     """
                 params.extend([RoleChoices.ADMIN, RoleChoices.OWNER])
-            cursor = conn_replica(connections)
             sql = (
                 (
                     """
@@ -273,8 +507,9 @@ class AccountCompany(CoreModel):
                 )
                 + filter_sql
             )
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
+            with replica_cursor(connections) as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
             account_ids = [str(row[0]) for row in rows]
             """
             ORM Version for Future Reference
@@ -311,14 +546,14 @@ class AccountCompany(CoreModel):
         try:
             assert acc_ids, _("Account IDs are required.")
             placeholders = ", ".join(["%s" for _ in range(len(acc_ids))])
-            cursor = conn_replica(connections)
             sql = f"""
                 SELECT user_id
                 FROM native_account_account aa
                 WHERE id IN ({placeholders}) AND is_active = true AND is_deleted = false
             """
-            cursor.execute(sql, acc_ids)
-            rows = cursor.fetchall()
+            with replica_cursor(connections) as cursor:
+                cursor.execute(sql, acc_ids)
+                rows = cursor.fetchall()
             user_ids = [str(row[0]) for row in rows]
         except Exception as exc:
             capture_exception(exc)
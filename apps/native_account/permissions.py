@@ -0,0 +1,108 @@
+"""
+Permission resolution of the `has_permission` filter and the role decorators.
+
+The role permissions of a user are resolved once per (user, selected company) pair
+and cached under
+    <prefix>_<user id>_<company id>_<version>
+The version is a random token per user; AccountCompany saves and deletes replace it,
+so every cached entry of the user is invalidated at once. It is read from the shared
+cache on every resolution (no in-process copy), so a demoted user loses the permissions
+on every worker at once. Switching the selected company changes the key itself.
+
+Within a request the resolved set is also kept on the TenantContext, so the lookups
+of a page with many permission-gated links are resolved only once.
+`superuser` and `staff` are read from the user object, they are not cached.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache_keys import (
+    USER_PERMISSIONS_CACHE_KEY,
+    USER_PERMISSIONS_VERSION_CACHE_KEY,
+)
+from core.local_cache import TwoTierCache
+from native_account.models import RoleChoices
+from tenant.context import get_tenant_context
+
+ROLE_PERMISSIONS = {
+    RoleChoices.OWNER: frozenset(["admin_role", "owner_role"]),
+    RoleChoices.ADMIN: frozenset(["admin_role"]),
+    RoleChoices.MEMBER: frozenset(),
+}
+
+user_permissions_cache = TwoTierCache(
+    USER_PERMISSIONS_CACHE_KEY,
+    timeout=settings.TENANT_PERMISSION_CACHE_TIMEOUT,
+    local_ttl=settings.TENANT_PERMISSION_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_PERMISSION_LOCAL_CACHE_SIZE,
+)
+
+
+def _get_version_key(user_id) -> str:
+    return f"{USER_PERMISSIONS_VERSION_CACHE_KEY}_{user_id}"
+
+
+def _get_version(user_id) -> str:
+    version = cache.get(_get_version_key(user_id), None)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        # Another process may have set it in the meantime.
+        if not cache.add(_get_version_key(user_id), version, timeout=None):
+            version = cache.get(_get_version_key(user_id), version)
+    return version
+
+
+def invalidate_user_permissions(user_id):
+    if user_id:
+        cache.set(_get_version_key(user_id), uuid.uuid4().hex[:12], timeout=None)
+
+
+def get_role_permissions(user) -> frozenset:
+    """
+    Returns the permissions granted by the role of the user in the selected company.
+    """
+    tenant_context = get_tenant_context(user)
+    if not tenant_context.user_id:
+        return frozenset()
+    if tenant_context._role_permissions is not None:
+        return tenant_context._role_permissions
+
+    company_id = tenant_context.company_id
+    if not company_id:
+        return frozenset()
+    # Read before the role, so a role read before an invalidation is cached under the old version.
+    version = _get_version(tenant_context.user_id)
+    permissions = user_permissions_cache.get(
+        f"{tenant_context.user_id}_{company_id}_{version}", None
+    )
+    if permissions is None:
+        # The role is loaded together with the selected company, which may differ
+        # from the (cached) one above; it is cached under the company it belongs to.
+        role = tenant_context.role
+        permissions = ROLE_PERMISSIONS.get(role, frozenset())
+        if tenant_context.company_id:
+            user_permissions_cache.set(
+                f"{tenant_context.user_id}_{tenant_context.company_id}_{version}",
+                permissions,
+            )
+
+    tenant_context._role_permissions = permissions
+    return permissions
+
+
+def get_user_permissions(user) -> frozenset:
+    permissions = set(get_role_permissions(user))
+    if user.is_superuser:
+        permissions.add("superuser")
+    if user.is_staff:
+        permissions.add("staff")
+    return frozenset(permissions)
+
+
+def has_permissions(user, *permissions) -> bool:
+    if not permissions:
+        return True
+    return set(permissions) <= get_user_permissions(user)
@@ -0,0 +1,28 @@
+from django.utils.encoding import force_str
+
+from core.serializers import BatchSerializer
+from native_account.models import RoleChoices
+
+
+class AccountCompanySerializer(BatchSerializer):
+    fields = (
+        "id",
+        "account__user__email",
+        "company__legal_name",
+        "is_selected",
+        "role",
+    )
+
+    def to_json(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "account": row["account__user__email"],
+            "company": row["company__legal_name"],
+            "is_selected": row["is_selected"],
+            "role": row["role"],
+            # Same as get_role_display()
+            "role_trans": force_str(
+                dict(RoleChoices.choices).get(row["role"], row["role"]),
+                strings_only=True,
+            ),
+        }
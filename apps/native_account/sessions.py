@@ -0,0 +1,170 @@
+"""
+user_id -> session keys index, maintained on login/logout and when a session key is
+rotated (cycle_key(), e.g. update_session_auth_hash() after a password change, see
+tenantisolation.middleware.UserSessionIndexMiddleware).
+
+The sessions are accessed through the SessionStore of SESSION_ENGINE, so the index works
+with both the db and the cache session engines.
+With django-redis the index is a Redis set updated with SADD/SREM, so concurrent logins
+and logouts do not lose keys. Other cache backends (e.g. LocMemCache in development) fall
+back to a read-modify-write of a list. The keys of the expired sessions are pruned at
+revoke time; the index expires SESSION_COOKIE_AGE after the last login.
+
+An index is complete once it holds every live session of the user. Until then (e.g. the
+sessions created before the index was introduced, or after the index expired) the revoke
+also scans the session table, which is possible only for the db-backed engines, and then
+marks the index complete.
+"""
+
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.utils import timezone
+from sentry_sdk import capture_exception
+
+from core.cache_keys import USER_SESSIONS_CACHE_KEY
+
+# Marks a complete index. The session keys are alphanumeric, so it cannot collide with them.
+_COMPLETE_MARKER = "*"
+
+
+def _get_session_store_class():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def _get_redis_client():
+    if not settings.CACHES["default"]["BACKEND"].startswith("django_redis"):
+        return None
+    return cache.client.get_client(write=True)
+
+
+def _index_key(user_id):
+    return f"{USER_SESSIONS_CACHE_KEY}_{user_id}"
+
+
+def _get_members(user_id):
+    redis_client = _get_redis_client()
+    if redis_client is None:
+        members = cache.get(_index_key(user_id), None)
+        return None if members is None else set(members)
+    members = redis_client.smembers(cache.client.make_key(_index_key(user_id)))
+    # A missing Redis set reads as an empty one.
+    return {x.decode() for x in members} or None
+
+
+def _add_members(user_id, *members):
+    redis_client = _get_redis_client()
+    if redis_client is None:
+        index = (_get_members(user_id) or set()).union(members)
+        cache.set(_index_key(user_id), list(index), timeout=settings.SESSION_COOKIE_AGE)
+        return
+    key = cache.client.make_key(_index_key(user_id))
+    pipeline = redis_client.pipeline()
+    pipeline.sadd(key, *members)
+    pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+    pipeline.execute()
+
+
+def _remove_members(user_id, *members):
+    redis_client = _get_redis_client()
+    if redis_client is None:
+        index = _get_members(user_id)
+        if index is not None:
+            index = index.difference(members)
+            cache.set(
+                _index_key(user_id), list(index), timeout=settings.SESSION_COOKIE_AGE
+            )
+        return
+    redis_client.srem(cache.client.make_key(_index_key(user_id)), *members)
+
+
+def get_user_session_keys(user_id):
+    """
+    Returns the indexed session keys of the user, None when the user has no index.
+    """
+    members = _get_members(user_id)
+    return None if members is None else members - {_COMPLETE_MARKER}
+
+
+def is_user_session_index_complete(user_id) -> bool:
+    return _COMPLETE_MARKER in (_get_members(user_id) or ())
+
+
+def add_user_session(user_id, session_key):
+    _add_members(user_id, session_key)
+
+
+def remove_user_session(user_id, session_key):
+    _remove_members(user_id, session_key)
+
+
+def _scan_session_keys(user_ids):
+    """
+    Returns {user_id: session keys} of the given users, or None when the sessions of
+    SESSION_ENGINE cannot be scanned.
+    """
+    if settings.SESSION_ENGINE not in (
+        "django.contrib.sessions.backends.db",
+        "django.contrib.sessions.backends.cached_db",
+    ):
+        return None
+
+    from django.contrib.sessions.models import Session
+
+    user_ids = {str(user_id) for user_id in user_ids}
+    session_keys = {user_id: set() for user_id in user_ids}
+    sessions = Session.objects.filter(expire_date__gt=timezone.now())
+    for session in sessions.iterator():
+        user_id = session.get_decoded().get("_auth_user_id")
+        if user_id in user_ids:
+            session_keys[user_id].add(session.session_key)
+    return session_keys
+
+
+def revoke_user_sessions(user_ids):
+    """
+    Deletes every session of the given users.
+    Costs O(sessions of these users), unless the index of some of them is not complete yet.
+    """
+    session_store_class = _get_session_store_class()
+    session_keys_by_user = {}
+    incomplete_user_ids = []
+    for user_id in {str(user_id) for user_id in user_ids}:
+        members = _get_members(user_id) or set()
+        if _COMPLETE_MARKER not in members:
+            incomplete_user_ids.append(user_id)
+        session_keys_by_user[user_id] = members - {_COMPLETE_MARKER}
+    scanned_session_keys = None
+    if incomplete_user_ids:
+        scanned_session_keys = _scan_session_keys(incomplete_user_ids)
+        for user_id, session_keys in (scanned_session_keys or {}).items():
+            session_keys_by_user[user_id] |= session_keys
+
+    for user_id, session_keys in session_keys_by_user.items():
+        for session_key in session_keys:
+            try:
+                session_store_class().delete(session_key)
+            except Exception as exc:
+                capture_exception(exc)
+        # Only the revoked keys, the concurrent logins stay indexed.
+        if session_keys:
+            _remove_members(user_id, *session_keys)
+        if scanned_session_keys is not None and user_id in scanned_session_keys:
+            _add_members(user_id, _COMPLETE_MARKER)
+
+
+@receiver(user_logged_in)
+def index_session_on_login(sender, request, user, **kwargs):
+    session_key = getattr(getattr(request, "session", None), "session_key", None)
+    if session_key:
+        add_user_session(user.id, session_key)
+
+
+@receiver(user_logged_out)
+def unindex_session_on_logout(sender, request, user, **kwargs):
+    session_key = getattr(getattr(request, "session", None), "session_key", None)
+    if user is not None and session_key:
+        remove_user_session(user.id, session_key)
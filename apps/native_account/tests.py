@@ -1,3 +1,341 @@
-from django.test import TestCase
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model, update_session_auth_hash
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from company.models import Company
+from core import cache_invalidation
+from native_account.models import (
+    Account,
+    AccountCompany,
+    AccountCompanyQuerySet,
+    RoleChoices,
+)
+from native_account.sessions import (
+    add_user_session,
+    get_user_session_keys,
+    is_user_session_index_complete,
+    revoke_user_sessions,
+)
+from tenant.caches import selected_tenant_cache
+from tenantisolation.middleware import UserSessionIndexMiddleware
+
+
+def create_user(name):
+    return get_user_model().objects.create_user(name, f"{name}@example.com")
+
+
+def create_account(name):
+    user = create_user(name)
+    account = Account(user=user, phone="0")
+    account.save(user=user)
+    return account
+
+
+def create_company(name, user):
+    company = Company(legal_name=name, tax_office="-", tax_no=name)
+    company.save(user=user)
+    return company
+
+
+def add_company(account, company, role=RoleChoices.MEMBER, **kwargs):
+    account_company = AccountCompany(
+        account=account, company=company, role=role, **kwargs
+    )
+    account_company.save(user=account.user)
+    return account_company
+
+
+def login(user) -> str:
+    client = Client()
+    client.force_login(user)
+    return client.session.session_key
+
+
+def session_exists(session_key) -> bool:
+    return import_module(settings.SESSION_ENGINE).SessionStore().exists(session_key)
+
+
+class NativeAccountTestCase(TestCase):
+    def setUp(self):
+        # The caches outlive the test transactions.
+        cache.clear()
+        cache_invalidation._clear_all()
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+class UserSessionIndexTests(NativeAccountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user_a")
+        cls.other_user = create_user("user_b")
+
+    def test_login_and_logout_maintain_the_index(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(
+            get_user_session_keys(self.user.id), {client.session.session_key}
+        )
+
+        client.logout()
+
+        self.assertFalse(get_user_session_keys(self.user.id))
+
+    def test_rotated_session_key_is_indexed(self):
+        session_key = login(self.user)
+        request = RequestFactory().get("/")
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+            session_key
+        )
+        request.user = self.user
+
+        def change_password(request):
+            update_session_auth_hash(request, self.user)
+            return HttpResponse()
+
+        UserSessionIndexMiddleware(change_password)(request)
+
+        rotated_session_key = request.session.session_key
+        self.assertNotEqual(rotated_session_key, session_key)
+        self.assertEqual(get_user_session_keys(self.user.id), {rotated_session_key})
+        revoke_user_sessions([self.user.id])
+        self.assertFalse(session_exists(rotated_session_key))
+
+    def test_revoke_prunes_the_missing_sessions(self):
+        add_user_session(self.user.id, "missing")
+        session_key = login(self.user)
+        self.assertEqual(get_user_session_keys(self.user.id), {"missing", session_key})
+
+        revoke_user_sessions([self.user.id])
+
+        self.assertEqual(get_user_session_keys(self.user.id), set())
+
+    def test_revoke_user_sessions(self):
+        session_keys = [login(self.user), login(self.user)]
+        other_session_key = login(self.other_user)
+
+        revoke_user_sessions([self.user.id])
+
+        self.assertFalse(any(session_exists(x) for x in session_keys))
+        self.assertEqual(get_user_session_keys(self.user.id), set())
+        self.assertTrue(session_exists(other_session_key))
+
+    def test_revoke_user_sessions_without_index(self):
+        session_key = login(self.user)
+        other_session_key = login(self.other_user)
+        cache.clear()
+        self.assertIsNone(get_user_session_keys(self.user.id))
+
+        revoke_user_sessions([self.user.id])
+
+        self.assertFalse(session_exists(session_key))
+        self.assertTrue(session_exists(other_session_key))
+
+    def test_revoke_user_sessions_with_incomplete_index(self):
+        # Logged in before the index was introduced.
+        session_key = login(self.user)
+        cache.clear()
+        indexed_session_key = login(self.user)
+        self.assertEqual(get_user_session_keys(self.user.id), {indexed_session_key})
+        self.assertFalse(is_user_session_index_complete(self.user.id))
+
+        revoke_user_sessions([self.user.id])
+
+        self.assertFalse(session_exists(session_key))
+        self.assertFalse(session_exists(indexed_session_key))
+        self.assertTrue(is_user_session_index_complete(self.user.id))
+
+    def test_complete_index_is_not_scanned(self):
+        login(self.user)
+        revoke_user_sessions([self.user.id])
+        session_key = login(self.user)
+
+        with mock.patch(
+            "native_account.sessions._scan_session_keys", side_effect=AssertionError
+        ):
+            revoke_user_sessions([self.user.id])
+
+        self.assertFalse(session_exists(session_key))
+        self.assertTrue(is_user_session_index_complete(self.user.id))
+
+
+class AccountCompanyDeleteTests(NativeAccountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = create_account("user_a")
+        cls.user = cls.account.user
+        cls.companies = [create_company(f"company_{i}", cls.user) for i in range(3)]
+
+    def get_selected_company_ids(self, account):
+        return list(
+            AccountCompany.objects.filter(
+                account=account, is_selected=True
+            ).values_list("company_id", flat=True)
+        )
+
+    def test_deleting_the_selected_company_selects_the_newest_one(self):
+        selected = add_company(self.account, self.companies[0], RoleChoices.OWNER)
+        add_company(self.account, self.companies[1])
+        add_company(self.account, self.companies[2])
+        self.assertEqual(
+            self.get_selected_company_ids(self.account), [self.companies[0].id]
+        )
+
+        selected.delete()
+
+        self.assertEqual(
+            self.get_selected_company_ids(self.account), [self.companies[2].id]
+        )
+        self.assertEqual(
+            str(selected_tenant_cache.get(self.user.id)), str(self.companies[2].id)
+        )
+
+    def test_deleting_another_company_keeps_the_selection(self):
+        add_company(self.account, self.companies[0], RoleChoices.OWNER)
+        other = add_company(self.account, self.companies[1])
+
+        other.delete()
+
+        self.assertEqual(
+            self.get_selected_company_ids(self.account), [self.companies[0].id]
+        )
+
+    def test_inactive_company_is_not_selected(self):
+        selected = add_company(self.account, self.companies[0], RoleChoices.OWNER)
+        add_company(self.account, self.companies[1], is_active=False)
+
+        selected.delete()
+
+        self.assertEqual(self.get_selected_company_ids(self.account), [])
+        self.assertIsNone(selected_tenant_cache.get(self.user.id))
+
+    def test_queryset_delete_keeps_one_selected_company_per_account(self):
+        shared_company = self.companies[0]
+        accounts = [self.account, create_account("user_b"), create_account("user_c")]
+        for i, account in enumerate(accounts):
+            add_company(
+                account,
+                shared_company,
+                RoleChoices.OWNER if i == 0 else RoleChoices.MEMBER,
+            )
+            add_company(account, create_company(f"own_company_{i}", account.user))
+        session_key = login(self.user)
+
+        deleted_count = AccountCompany.objects.filter(company=shared_company).delete()
+
+        self.assertEqual(deleted_count, len(accounts))
+        for account in accounts:
+            selected_company_ids = self.get_selected_company_ids(account)
+            self.assertEqual(len(selected_company_ids), 1)
+            self.assertNotEqual(selected_company_ids[0], shared_company.id)
+            self.assertEqual(
+                str(selected_tenant_cache.get(account.user_id)),
+                str(selected_company_ids[0]),
+            )
+        self.assertFalse(session_exists(session_key))
+
+    def test_failed_reselection_does_not_abort_the_delete(self):
+        selected = add_company(self.account, self.companies[0], RoleChoices.OWNER)
+        add_company(self.account, self.companies[1])
+
+        def reselect_next_account_companies(queryset, account_ids):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 / 0")
+
+        with mock.patch.object(
+            AccountCompanyQuerySet,
+            "_reselect_next_account_companies",
+            reselect_next_account_companies,
+        ):
+            deleted_count = AccountCompany.objects.filter(id=selected.id).delete()
+
+        self.assertEqual(deleted_count, 1)
+        self.assertFalse(AccountCompany.objects.filter(id=selected.id).exists())
+        self.assertEqual(self.get_selected_company_ids(self.account), [])
+
+
+class SelectedCompanyTests(NativeAccountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = create_account("user_a")
+        cls.user = cls.account.user
+        cls.companies = [create_company(f"company_{i}", cls.user) for i in range(3)]
+        cls.selected = add_company(cls.account, cls.companies[0], RoleChoices.OWNER)
+        cls.other = add_company(cls.account, cls.companies[1])
+
+    def get_selected_company_ids(self):
+        return list(
+            AccountCompany.objects.filter(
+                account=self.account, is_selected=True
+            ).values_list("company_id", flat=True)
+        )
+
+    def test_database_rejects_a_second_selected_company(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AccountCompany.objects.filter(id=self.other.id).update(is_selected=True)
+
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[0].id])
+
+    def test_save_releases_the_selected_company(self):
+        self.other.is_selected = True
+        self.other.save(user=self.user)
+
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[1].id])
+
+    def test_switch_selected_runs_a_single_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            updated_count = AccountCompany.objects.switch_selected(
+                self.user, self.companies[1].id
+            )
+
+        self.assertEqual(updated_count, 2)
+        self.assertEqual(
+            len([x for x in queries.captured_queries if x["sql"].startswith("UPDATE")]),
+            1,
+        )
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[1].id])
+        self.assertEqual(
+            str(selected_tenant_cache.get(self.user.id)), str(self.companies[1].id)
+        )
+
+    def test_switch_selected_rejects_other_companies(self):
+        inactive = add_company(self.account, self.companies[2], is_active=False)
+
+        for company_id in [self.companies[2].id, create_company("other", self.user).id]:
+            with self.assertRaises(AssertionError):
+                AccountCompany.objects.switch_selected(self.user, company_id)
+
+        self.assertFalse(AccountCompany.objects.get(id=inactive.id).is_selected)
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[0].id])
+
+    def test_switch_selected_retries_a_conflict_once(self):
+        update = AccountCompanyQuerySet.update
+        calls = []
+
+        def conflicting_update(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError("unique_selected_accountcompany")
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(AccountCompanyQuerySet, "update", conflicting_update):
+            AccountCompany.objects.switch_selected(self.user, self.companies[1].id)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[1].id])
+
+    def test_switch_selected_raises_a_repeated_conflict(self):
+        def conflicting_update(queryset, **kwargs):
+            raise IntegrityError("unique_selected_accountcompany")
+
+        with mock.patch.object(AccountCompanyQuerySet, "update", conflicting_update):
+            with self.assertRaises(IntegrityError):
+                AccountCompany.objects.switch_selected(self.user, self.companies[1].id)
+
+        self.assertEqual(self.get_selected_company_ids(), [self.companies[0].id])
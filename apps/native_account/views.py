@@ -30,21 +30,7 @@ def accountcompany_change(request):
 
     if user.is_authenticated and tenant_company_id:
         try:
-            from core.cache_keys import SELECTED_TCID_CACHE_KEY
-
-            account = user.account
-
-            selected_obj = AccountCompany.objects.get(
-                account=account, company_id=tenant_company_id
-            )
-            selected_obj.is_selected = True
-            selected_obj.save(user=request.user)
-
-            cache.set(
-                f"{SELECTED_TCID_CACHE_KEY}_{user.id}",
-                selected_obj.company_id,
-                timeout=None,
-            )
+            AccountCompany.objects.switch_selected(user, tenant_company_id)
 
             return JsonResponse(
                 {
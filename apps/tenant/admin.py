@@ -1,13 +1,135 @@
+from django.apps import apps
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.template.response import TemplateResponse
 from core.admin import CoreAdmin
-from constance import config as constance_config
+from core.pagination import (
+    ESTIMATED_COUNT_THRESHOLD,
+    EstimatedCountPaginator,
+    keyset_paginate,
+)
+from core.constance_snapshot import config as constance_config
+
+CURSOR_VAR = "cursor"
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Paginates the changelist with keyset queries on `keyset_ordering` instead of OFFSET,
+    while it is not sorted by a column. The pages are only navigated forwards.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+        # The sorting/filtering links start from the first page.
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def is_keyset_paginated(self):
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def get_results(self, request):
+        if not self.is_keyset_paginated():
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        try:
+            result_list, self.next_cursor = keyset_paginate(
+                self.queryset,
+                self.model_admin.keyset_ordering,
+                cursor=self.cursor,
+                limit=self.list_per_page,
+            )
+        except (ValueError, AssertionError):
+            raise IncorrectLookupParameters
+
+        if self.model_admin.show_full_result_count:
+            full_result_count = self.model_admin.get_paginator(
+                request, self.root_queryset, self.list_per_page
+            ).count
+        else:
+            full_result_count = None
+
+        self.result_count = paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.show_admin_actions = not self.show_full_result_count or bool(
+            full_result_count
+        )
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+    def get_next_page_query_string(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def get_first_page_query_string(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+
+def is_tenant_company_autocomplete(request) -> bool:
+    """
+    Whether the request is an admin autocomplete of the `tenant_company` field of a TenantCoreModel.
+    """
+    from tenant.models import TenantCoreModel
+
+    if request.GET.get("field_name") != "tenant_company":
+        return False
+    try:
+        model = apps.get_model(
+            request.GET.get("app_label"), request.GET.get("model_name")
+        )
+    except (LookupError, ValueError, TypeError):
+        return False
+    return issubclass(model, TenantCoreModel)
+
+
+class TenantCompanyAutocompleteMixin:
+    """
+    For the admin of the Company model: limits the autocomplete of the `tenant_company`
+    fields of the TenantCoreModel forms to the selected company of the user.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if constance_config.ADMIN_SITE_ISOLATION and is_tenant_company_autocomplete(
+            request
+        ):
+            # The objects are saved to the selected company of the user.
+            tenant_context = getattr(request, "tenant_context", None)
+            company_id = tenant_context.company_id if tenant_context else None
+            queryset = queryset.filter(id=company_id) if company_id else queryset.none()
+        return super().get_search_results(request, queryset, search_term)
 
 
 class TenantCoreAdmin(CoreAdmin):
     """
     Querysets for the select/autocomplete fields must be overrided separately.
+
+    For the large tables:
+    - estimated_count: the changelist uses the planner estimate instead of COUNT(*)
+      above estimated_count_threshold rows. Set show_full_result_count = False as well,
+      otherwise the unfiltered rows are counted too (estimated, with this option).
+    - keyset_pagination: the changelist pages are keyset queries on keyset_ordering
+      (the last field must be unique) instead of OFFSET, while no column is sorted.
+    - Prefix search ("^name" in search_fields) can use an index on
+      (tenant_company, UPPER(name::text) text_pattern_ops).
     """
 
+    estimated_count = False
+    estimated_count_threshold = ESTIMATED_COUNT_THRESHOLD
+    keyset_pagination = False
+    keyset_ordering = ("-created_at", "-id")
+
     # This will prevent the appearance of the rows from another tenants in admin page.
     """
     def get_queryset(self, request):
@@ -50,3 +172,30 @@ class TenantCoreAdmin(CoreAdmin):
         if ordering:
             qs = qs.order_by(*ordering)
         return qs
+
+    def get_paginator(self, request, queryset, per_page, *args, **kwargs):
+        if self.estimated_count:
+            return EstimatedCountPaginator(
+                queryset,
+                per_page,
+                *args,
+                threshold=self.estimated_count_threshold,
+                **kwargs,
+            )
+        return super().get_paginator(request, queryset, per_page, *args, **kwargs)
+
+    def get_changelist(self, request, **kwargs):
+        if self.keyset_pagination:
+            return KeysetChangeList
+        return super().get_changelist(request, **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if (
+            self.keyset_pagination
+            and self.change_list_template is None
+            and isinstance(response, TemplateResponse)
+        ):
+            # The response is not rendered yet.
+            response.template_name = "tenant/admin/keyset_change_list.html"
+        return response
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TenantConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tenant'
+
+    def ready(self):
+        from django.conf import settings
+
+        if settings.TENANT_RLS_ENABLED:
+            from django.db.backends.signals import connection_created
+            from tenant.rls import install_rls_execute_wrapper
+
+            connection_created.connect(install_rls_execute_wrapper)
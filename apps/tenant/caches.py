@@ -0,0 +1,55 @@
+from django.conf import settings
+
+from core.cache_keys import (
+    ACCOUNT_INFO_CACHE_KEY,
+    ACCOUNT_INFO_VERSION_CACHE_KEY,
+    ONBOARDED_USER_CACHE_KEY,
+    SELECTED_TCID_CACHE_KEY,
+    VALIDATED_TCID_CACHE_KEY,
+)
+from core.local_cache import TwoTierCache
+
+# user_id -> selected Tenant Company ID.
+# Updated by AccountCompany.save()/delete() and AccountCompany.objects.switch_selected().
+selected_tenant_cache = TwoTierCache(
+    SELECTED_TCID_CACHE_KEY,
+    timeout=None,
+    local_ttl=settings.TENANT_SELECTED_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_SELECTED_LOCAL_CACHE_SIZE,
+)
+
+# user_id -> True, once the user has an account with a selected company (RedirectMiddleware).
+# Dropped when the account of the user is left without a selected company (AccountCompany
+# deletes, deactivations).
+onboarded_user_cache = TwoTierCache(
+    ONBOARDED_USER_CACHE_KEY,
+    timeout=None,
+    local_ttl=settings.TENANT_ONBOARDING_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_ONBOARDING_LOCAL_CACHE_SIZE,
+)
+
+# Tenant Company IDs which passed the validation in `__get_validated_tenant_company_id`.
+# Invalidated by the Company and AccountCompany saves/deletes.
+validated_tenant_cache = TwoTierCache(
+    VALIDATED_TCID_CACHE_KEY,
+    timeout=settings.TENANT_VALIDATION_CACHE_TIMEOUT,
+    local_ttl=settings.TENANT_VALIDATION_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_VALIDATION_LOCAL_CACHE_SIZE,
+)
+
+# user_id -> version token of the `account_info` entries of the user.
+# Replaced by the AccountCompany and Company writes, see `tenant.context.invalidate_account_info()`.
+account_info_versions = TwoTierCache(
+    ACCOUNT_INFO_VERSION_CACHE_KEY,
+    timeout=None,
+    local_ttl=settings.TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE,
+)
+
+# <user_id>_<version> -> output of the `account_info` context processor.
+account_info_cache = TwoTierCache(
+    ACCOUNT_INFO_CACHE_KEY,
+    timeout=settings.TENANT_ACCOUNT_INFO_CACHE_TIMEOUT,
+    local_ttl=settings.TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL,
+    local_maxsize=settings.TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE,
+)
@@ -0,0 +1,223 @@
+import contextvars
+import uuid
+from typing import Union
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from sentry_sdk import capture_exception
+
+from core.utils import replica_cursor
+from tenant.caches import (
+    account_info_cache,
+    account_info_versions,
+    selected_tenant_cache,
+)
+
+_current_tenant_context = contextvars.ContextVar("tenant_context", default=None)
+
+
+class TenantContext:
+    """
+    Request-scoped tenant information of a user.
+
+    The selected company, the role in that company and the list of the other
+    available companies are resolved with a single query on first access and
+    reused by the TenantCoreManager, TenantCoreModel.save(), the role decorators,
+    the `has_permission` filter and the `account_info` context processor.
+
+    `company_id` alone is answered from the selected tenant cache when possible,
+    so views that only query tenant models do not pay for the full lookup.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = user.id if user is not None and user.is_authenticated else None
+        self.reset()
+
+    def reset(self):
+        self._loaded = False
+        self._company_id = None
+        self._company_legal_name = ""
+        self._role = None
+        self._available_companies = []
+        # Set by `native_account.permissions.get_role_permissions()`.
+        self._role_permissions = None
+
+    def _load(self):
+        self._loaded = True
+        # The company id may have been answered from the cache before.
+        self._company_id = None
+        self._available_companies = []
+        if not self.user_id:
+            return
+        try:
+            """
+            ORM Version for Future Reference
+            rows = (
+                AccountCompany.objects.filter(account__user_id=self.user_id)
+                .filter(Q(is_selected=True) | Q(is_active=True, is_deleted=False))
+                .values_list("company_id", "company__legal_name", "role", "is_selected")
+            )
+            """
+            sql = """
+                SELECT ac.company_id, cc.legal_name, ac.role, ac.is_selected
+                FROM native_account_accountcompany ac
+                JOIN native_account_account aa ON ac.account_id = aa.id
+                JOIN company_company cc ON ac.company_id = cc.id
+                WHERE aa.user_id = %s
+                AND (ac.is_selected = true OR (ac.is_active = true AND ac.is_deleted = false))
+            """
+            with replica_cursor(connections) as cursor:
+                cursor.execute(sql, [self.user_id])
+                rows = cursor.fetchall()
+        except Exception as exc:
+            capture_exception(exc)
+            rows = []
+
+        for company_id, legal_name, role, is_selected in rows:
+            if is_selected and self._company_id is None:
+                self._company_id = str(company_id)
+                self._company_legal_name = str(legal_name)
+                self._role = int(role)
+            elif not is_selected:
+                self._available_companies.append((str(company_id), str(legal_name)))
+
+        # Writing the cache publishes an invalidation, so it is skipped if the entry is up to date.
+        if (
+            self._company_id
+            and str(selected_tenant_cache.get(self.user_id, None)) != self._company_id
+        ):
+            selected_tenant_cache.set(self.user_id, self._company_id)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    @property
+    def company_id(self) -> Union[str, None]:
+        if self._loaded or self._company_id is not None:
+            return self._company_id
+        if self.user_id:
+            cached_id = selected_tenant_cache.get(self.user_id, None)
+            if cached_id:
+                self._company_id = str(cached_id)
+                return self._company_id
+        self._ensure_loaded()
+        return self._company_id
+
+    async def aget_company_id(self) -> Union[str, None]:
+        """
+        Async counterpart of `company_id`. The cache is read with the asyncio Redis client,
+        only a cache miss runs the lookup query in the thread pool.
+        """
+        if self._loaded or self._company_id is not None:
+            return self._company_id
+        if self.user_id:
+            cached_id = await selected_tenant_cache.aget(self.user_id, None)
+            if cached_id:
+                self._company_id = str(cached_id)
+                return self._company_id
+        await sync_to_async(self._ensure_loaded)()
+        return self._company_id
+
+    @property
+    def company_legal_name(self) -> str:
+        self._ensure_loaded()
+        return self._company_legal_name
+
+    @property
+    def role(self) -> Union[int, None]:
+        self._ensure_loaded()
+        return self._role
+
+    @property
+    def available_companies(self) -> list:
+        self._ensure_loaded()
+        return self._available_companies
+
+
+def set_current_tenant_context(tenant_context):
+    return _current_tenant_context.set(tenant_context)
+
+
+def reset_current_tenant_context(token):
+    _current_tenant_context.reset(token)
+
+
+def get_current_tenant_context(user=None) -> Union[TenantContext, None]:
+    """
+    Returns the context of the current request, if it belongs to the given user.
+    """
+    tenant_context = _current_tenant_context.get()
+    if tenant_context is None:
+        return None
+    if user is not None and tenant_context.user_id != user.id:
+        return None
+    return tenant_context
+
+
+def get_tenant_context(user) -> TenantContext:
+    """
+    Returns the context of the current request, or a standalone one for the user
+    (e.g. outside of the request/response cycle or without the middleware).
+    """
+    return get_current_tenant_context(user) or TenantContext(user)
+
+
+def invalidate_tenant_context(user_id=None):
+    tenant_context = _current_tenant_context.get()
+    if tenant_context is not None and (
+        user_id is None or tenant_context.user_id == user_id
+    ):
+        tenant_context.reset()
+
+
+def _get_account_info_version(user_id) -> str:
+    version = account_info_versions.get(user_id, None)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        account_info_versions.set(user_id, version)
+    return version
+
+
+def invalidate_account_info(user_ids):
+    """
+    Replaces the `account_info` version of the users, their cached entries are not read again.
+    """
+    for user_id in user_ids:
+        if user_id:
+            account_info_versions.set(user_id, uuid.uuid4().hex[:12])
+
+
+def get_account_info(user) -> dict:
+    """
+    Returns the selected company (id, legal name) and the other available companies of the
+    user. Cached per user, unless the tenant context of the request is already loaded.
+    """
+    tenant_context = get_tenant_context(user)
+    if not tenant_context.user_id:
+        return {
+            "tenant_company_id": None,
+            "tenant_company_name": "",
+            "available_tenant_companies": [],
+        }
+
+    cache_key = None
+    if not tenant_context._loaded:
+        cache_key = f"{tenant_context.user_id}_{_get_account_info_version(tenant_context.user_id)}"
+        account_info = account_info_cache.get(cache_key, None)
+        if account_info is not None:
+            return account_info
+
+    tenant_company_id, tenant_company_name = None, ""
+    if tenant_context.company_id and tenant_context.company_legal_name:
+        tenant_company_id = tenant_context.company_id
+        tenant_company_name = tenant_context.company_legal_name
+    account_info = {
+        "tenant_company_id": tenant_company_id,
+        "tenant_company_name": tenant_company_name,
+        "available_tenant_companies": tenant_context.available_companies,
+    }
+    if cache_key:
+        account_info_cache.set(cache_key, account_info)
+    return account_info
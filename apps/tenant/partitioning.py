@@ -0,0 +1,256 @@
+"""
+PostgreSQL declarative partitioning of TenantCoreModel tables by `tenant_company_id`.
+
+Opt-in with TENANT_PARTITIONING_ENABLED. A TenantCoreModel subclass declares its method
+with a class attribute:
+    TENANT_PARTITIONING = "list"   # a partition per tenant, plus a default partition
+    TENANT_PARTITIONING = "hash"   # TENANT_PARTITION_COUNT partitions
+and its table is converted by the `PartitionByTenant` migration operation. The operation
+is a no-op while the setting is off; the tables of a deployment which enables it later
+are converted by `manage.py create_tenant_partitions --convert`.
+
+With LIST partitioning, the rows of a new company are stored in the default partition
+until `manage.py create_tenant_partitions` (a periodic job, run as the owner of the
+tables) creates the partition of the company and moves them out. The DDL locks the
+partitioned table, so it is not run in the request which creates the company.
+A tenant partition can be vacuumed, detached or archived on its own.
+
+PostgreSQL requires the partition key in every unique constraint, so the primary key
+of a partitioned table is (id, tenant_company_id) and other tables cannot reference
+it with foreign keys. The `id` stays the primary key on the Django side.
+On the other database backends, the tables are left as they are.
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, migrations, transaction
+from django.db.backends.utils import truncate_name
+
+LIST_PARTITIONING = "list"
+HASH_PARTITIONING = "hash"
+TENANT_COLUMN = "tenant_company_id"
+
+
+def get_partitioned_models(method=None) -> list:
+    from tenant.models import TenantCoreModel
+
+    return [
+        model
+        for model in apps.get_models()
+        if issubclass(model, TenantCoreModel)
+        and getattr(model, "TENANT_PARTITIONING", None)
+        and (method is None or model.TENANT_PARTITIONING == method)
+    ]
+
+
+def get_partition_name(connection, table, suffix) -> str:
+    return truncate_name(f"{table}_p_{suffix}", connection.ops.max_name_length())
+
+
+def get_default_partition_name(connection, table) -> str:
+    return get_partition_name(connection, table, "default")
+
+
+def get_tenant_partition_name(connection, table, company_id) -> str:
+    return get_partition_name(connection, table, str(company_id).replace("-", ""))
+
+
+def is_partitioned(connection, table) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON pt.partrelid = c.oid
+            WHERE c.relname = %s AND c.relnamespace = to_regnamespace(current_schema())
+            """,
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def is_partitioning_enabled() -> bool:
+    return settings.TENANT_PARTITIONING_ENABLED
+
+
+def _partition_exists(connection, name) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        return cursor.fetchone()[0]
+
+
+def create_tenant_partition(model, company_id, using="default"):
+    """
+    Creates the LIST partition of the company. The rows of the company which were stored in the
+    default partition in the meantime are moved into it.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    partition = get_tenant_partition_name(connection, table, company_id)
+    default_partition = get_default_partition_name(connection, table)
+    if _partition_exists(connection, partition):
+        return
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {qn(default_partition)} WHERE {qn(TENANT_COLUMN)} = %s)",
+            [company_id],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {qn(partition)} PARTITION OF {qn(table)} FOR VALUES IN (%s)",
+                [str(company_id)],
+            )
+            return
+
+        # A partition cannot be attached while the default partition holds its rows.
+        cursor.execute(
+            f"CREATE TABLE {qn(partition)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(default_partition)} WHERE {qn(TENANT_COLUMN)} = %s RETURNING *) "
+            f"INSERT INTO {qn(partition)} SELECT * FROM moved",
+            [company_id],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(partition)} FOR VALUES IN (%s)",
+            [str(company_id)],
+        )
+
+
+def create_tenant_partitions(company_id, using="default"):
+    """
+    Creates the partitions of the company for every LIST-partitioned model.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    for model in get_partitioned_models(LIST_PARTITIONING):
+        if is_partitioned(connection, model._meta.db_table):
+            create_tenant_partition(model, company_id, using=using)
+
+
+def partition_table(schema_editor, model, method, partition_count, company_ids):
+    """
+    Converts the table of the model into a table partitioned by `tenant_company_id`,
+    with the LIST partitions of `company_ids`. The rows are copied, so the table is
+    locked for the duration of the conversion. A no-op if the table is already partitioned.
+    """
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    if is_partitioned(connection, table):
+        return
+    qn = connection.ops.quote_name
+    old_table = truncate_name(
+        f"{table}__unpartitioned", connection.ops.max_name_length()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(%s)", [table]
+        )
+        row = cursor.fetchone()
+    has_rls = bool(row and row[0])
+
+    schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old_table)}")
+    schema_editor.execute(
+        f"CREATE TABLE {qn(table)} (LIKE {qn(old_table)} INCLUDING DEFAULTS INCLUDING STORAGE) "
+        f"PARTITION BY {method.upper()} ({qn(TENANT_COLUMN)})"
+    )
+
+    if method == LIST_PARTITIONING:
+        schema_editor.execute(
+            f"CREATE TABLE {qn(get_default_partition_name(connection, table))} "
+            f"PARTITION OF {qn(table)} DEFAULT"
+        )
+        for company_id in company_ids:
+            schema_editor.execute(
+                f"CREATE TABLE {qn(get_tenant_partition_name(connection, table, company_id))} "
+                f"PARTITION OF {qn(table)} FOR VALUES IN (%s)",
+                [str(company_id)],
+            )
+    else:
+        for remainder in range(partition_count):
+            schema_editor.execute(
+                f"CREATE TABLE {qn(get_partition_name(connection, table, remainder))} "
+                f"PARTITION OF {qn(table)} "
+                f"FOR VALUES WITH (MODULUS {partition_count}, REMAINDER {remainder})"
+            )
+
+    schema_editor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old_table)}")
+    # Fails if another table still references the old one.
+    schema_editor.execute(f"DROP TABLE {qn(old_table)}")
+
+    pk_column = model._meta.pk.column
+    schema_editor.execute(
+        f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(truncate_name(f'{table}_pkey', connection.ops.max_name_length()))} "
+        f"PRIMARY KEY ({qn(pk_column)}, {qn(TENANT_COLUMN)})"
+    )
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(
+                schema_editor._create_fk_sql(
+                    model, field, "_fk_%(to_table)s_%(to_column)s"
+                )
+            )
+    for sql in schema_editor._model_indexes_sql(model):
+        schema_editor.execute(sql)
+    for constraint in model._meta.constraints:
+        schema_editor.add_constraint(model, constraint)
+    if has_rls:
+        from tenant.rls import enable_tenant_rls
+
+        # The policy of the old table was dropped with it.
+        enable_tenant_rls(schema_editor, model)
+
+
+class PartitionByTenant(migrations.operations.base.Operation):
+    """
+    Converts the table of a TenantCoreModel subclass into a table partitioned by
+    `tenant_company_id` (see the module docstring). The rows are copied into the
+    partitioned table, so the table is locked for the duration of the migration.
+    """
+
+    reversible = False
+    reduces_to_sql = False
+
+    def __init__(self, model_name, method=LIST_PARTITIONING, partition_count=16):
+        assert method in (LIST_PARTITIONING, HASH_PARTITIONING), method
+        self.model_name = model_name
+        self.method = method
+        self.partition_count = partition_count
+
+    def deconstruct(self):
+        kwargs = {"model_name": self.model_name, "method": self.method}
+        if self.method == HASH_PARTITIONING:
+            kwargs["partition_count"] = self.partition_count
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if (
+            schema_editor.connection.vendor != "postgresql"
+            or not is_partitioning_enabled()
+        ):
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        Company = to_state.apps.get_model("company", "Company")
+        partition_table(
+            schema_editor,
+            model,
+            self.method,
+            self.partition_count,
+            Company.objects.using(schema_editor.connection.alias).values_list(
+                "id", flat=True
+            ),
+        )
+
+    def describe(self):
+        return f"Partition {self.model_name} by tenant_company_id ({self.method})"
+
+    @property
+    def migration_name_fragment(self):
+        return f"partition_{self.model_name.lower()}_by_tenant"
@@ -0,0 +1,153 @@
+"""
+Per-tenant query result cache, see `TenantCoreManager.cached()`.
+
+The results are stored in the default cache under
+    <prefix>_<model>_<model generation>_<tenant id>_<tenant generation>_<query hash>
+The generations are random tokens kept in a TwoTierCache. A write replaces the
+generation of its tenant (or of the whole model, when the tenant is unknown),
+so every cached query of it is invalidated in O(1); the orphaned entries expire
+after TENANT_QUERY_CACHE_TIMEOUT. The tenant id is part of the key and of the
+cached SQL, so the results of one tenant are never served to another.
+
+Only the writes to the queried model invalidate its results. Results that
+embed the fields of related models (select_related, values() across relations)
+may be stale until these expire.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+
+from core.cache_keys import TENANT_QUERY_CACHE_KEY, TENANT_QUERY_GEN_CACHE_KEY
+from core.local_cache import TwoTierCache
+
+query_cache_generations = TwoTierCache(
+    TENANT_QUERY_GEN_CACHE_KEY,
+    timeout=None,
+    local_ttl=settings.TENANT_QUERY_CACHE_LOCAL_TTL,
+    local_maxsize=settings.TENANT_QUERY_CACHE_LOCAL_SIZE,
+)
+
+
+def _get_model_label(model) -> str:
+    return model._meta.concrete_model._meta.label_lower
+
+
+def _get_generation(name) -> str:
+    generation = query_cache_generations.get(name, None)
+    if generation is None:
+        generation = uuid.uuid4().hex[:12]
+        query_cache_generations.set(name, generation)
+    return generation
+
+
+def get_query_cache_key(model, tenant_company_id, digest) -> str:
+    label = _get_model_label(model)
+    tenant_company_id = str(tenant_company_id)
+    return "_".join(
+        [
+            TENANT_QUERY_CACHE_KEY,
+            label,
+            _get_generation(label),
+            tenant_company_id,
+            _get_generation(f"{label}_{tenant_company_id}"),
+            digest,
+        ]
+    )
+
+
+_in_tenant_write = contextvars.ContextVar("tenant_query_cache_write", default=False)
+
+
+@contextlib.contextmanager
+def tenant_write():
+    """
+    Marks a write whose queries are invalidated by the caller for its tenant, so that
+    the writes it runs internally (e.g. QuerySet.bulk_update() runs update() without
+    `tenant_user`) do not invalidate the queries of every tenant of the model.
+    """
+    token = _in_tenant_write.set(True)
+    try:
+        yield
+    finally:
+        _in_tenant_write.reset(token)
+
+
+def is_tenant_write() -> bool:
+    return _in_tenant_write.get()
+
+
+def invalidate_tenant_queries(model, tenant_company_id):
+    if not tenant_company_id:
+        return invalidate_model_queries(model)
+    label = _get_model_label(model)
+    query_cache_generations.set(f"{label}_{tenant_company_id}", uuid.uuid4().hex[:12])
+
+
+def invalidate_model_queries(model):
+    label = _get_model_label(model)
+    query_cache_generations.set(label, uuid.uuid4().hex[:12])
+
+
+class CachedQuerySetMixin:
+    """
+    Caches the results of a tenant-filtered queryset (iteration, list(), get(), first(),
+    count(), values()...). Returned by `TenantCoreManager.cached()`.
+    """
+
+    _cache_tenant_company_id = None
+    _cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_tenant_company_id = self._cache_tenant_company_id
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _get_query_cache_key(self, suffix=""):
+        if not self._cache_tenant_company_id or self.query.select_for_update:
+            return None
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        # values_list(flat=True) and values_list() run the same SQL.
+        normalized_query = repr(
+            (self._iterable_class.__name__, self._fields, sql, params, suffix)
+        )
+        digest = hashlib.sha1(normalized_query.encode()).hexdigest()
+        return get_query_cache_key(self.model, self._cache_tenant_company_id, digest)
+
+    def _get_cache_timeout(self):
+        if self._cache_timeout is None:
+            return settings.TENANT_QUERY_CACHE_TIMEOUT
+        return self._cache_timeout
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            cache_key = self._get_query_cache_key()
+            if cache_key:
+                results = cache.get(cache_key)
+                if results is None:
+                    super()._fetch_all()
+                    cache.set(cache_key, self._result_cache, self._get_cache_timeout())
+                    return
+                self._result_cache = results
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        cache_key = self._get_query_cache_key(suffix="count")
+        if not cache_key:
+            return super().count()
+        count = cache.get(cache_key)
+        if count is None:
+            count = super().count()
+            cache.set(cache_key, count, self._get_cache_timeout())
+        return count
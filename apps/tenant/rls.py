@@ -0,0 +1,211 @@
+"""
+PostgreSQL row level security (RLS) mode of the tenant isolation (TENANT_RLS_ENABLED).
+
+The tables of the TenantCoreModel subclasses get a policy (`EnableTenantRLS` migration
+operation) which only lets the rows of the tenant in the `app.tenant_company_id`
+setting through:
+    tenant_company_id = current_setting('app.tenant_company_id')::uuid
+so the raw queries of a request are isolated as well as the ORM queries.
+
+The TenantRLSMiddleware sets the tenant of the request and the execute wrapper
+installed on every connection applies it before the next query, together with
+`SET ROLE TENANT_RLS_ROLE`. The policies apply to that role; the owner of the
+tables (migrations, management commands, the requests without a tenant) is not
+restricted. The database user must be a member of TENANT_RLS_ROLE, and the role
+needs the privileges of the application on the tables and the sequences:
+    CREATE ROLE tenant_rls NOLOGIN;
+    GRANT tenant_rls TO <POSTGRES_USER>;
+    GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA public TO tenant_rls;
+    GRANT USAGE ON ALL SEQUENCES IN SCHEMA public TO tenant_rls;
+
+The settings are session-level and cached per database connection, so a connection
+only executes `set_config()` when the tenant of the queries changes. Inside a
+transaction, they are set transaction-local (SET LOCAL) instead, since a rollback
+would revert session-level settings. These are cached until the end of the transaction,
+or the rollback of the savepoint they were set in, which PostgreSQL reverts them at:
+an `on_commit()` marker is registered with them, and Django drops it at the same points.
+The wrapper must stay installed on a persistent connection, otherwise the next request
+would run with the settings of the previous one: it is inserted first in the
+`execute_wrappers` of the connection, and the middleware re-installs it on every request.
+
+RLS is defense-in-depth: TenantCoreManager still filters every query by the tenant.
+The querysets evaluated after the middleware (e.g. streamed responses) run without the
+tenant setting, i.e. as the owner of the tables, and rely on that filter.
+"""
+
+import contextvars
+import functools
+
+from django.conf import settings
+from django.db import migrations
+
+TENANT_SETTING_NAME = "app.tenant_company_id"
+POLICY_NAME = "tenant_isolation"
+
+_rls_tenant_company_id = contextvars.ContextVar("rls_tenant_company_id", default=None)
+
+
+def is_rls_enabled() -> bool:
+    return settings.TENANT_RLS_ENABLED
+
+
+def get_rls_tenant_company_id():
+    return _rls_tenant_company_id.get()
+
+
+def set_rls_tenant_company_id(tenant_company_id):
+    """
+    Returns a token for `reset_rls_tenant_company_id()`.
+    """
+    return _rls_tenant_company_id.set(
+        str(tenant_company_id) if tenant_company_id else None
+    )
+
+
+def reset_rls_tenant_company_id(token):
+    _rls_tenant_company_id.reset(token)
+
+
+# The savepoint statements do not read the tables. ROLLBACK TO SAVEPOINT must also run
+# in a failed transaction, where set_config() would fail.
+_SAVEPOINT_STATEMENTS = ("SAVEPOINT ", "RELEASE SAVEPOINT ", "ROLLBACK TO SAVEPOINT ")
+
+
+def _apply_rls_state(cursor, tenant_company_id, is_local):
+    cursor.execute(
+        "SELECT set_config('role', %s, %s), set_config(%s, %s, %s)",
+        [
+            settings.TENANT_RLS_ROLE if tenant_company_id else "none",
+            is_local,
+            TENANT_SETTING_NAME,
+            tenant_company_id,
+            is_local,
+        ],
+    )
+
+
+def _noop():
+    # The on_commit() marker of the transaction-local settings, see _get_local_states().
+    pass
+
+
+def _get_local_states(connection):
+    """
+    Returns the [(state, marker)] of the transaction-local settings still in effect.
+    """
+    local_states = getattr(connection, "_tenant_rls_local_states", None)
+    if not local_states or not connection.in_atomic_block:
+        return []
+    markers = {id(func) for _, func, _ in connection.run_on_commit}
+    return [x for x in local_states if id(x[1]) in markers]
+
+
+def rls_execute_wrapper(execute, sql, params, many, context):
+    if isinstance(sql, str) and sql.startswith(_SAVEPOINT_STATEMENTS):
+        return execute(sql, params, many, context)
+    connection = context["connection"]
+    tenant_company_id = get_rls_tenant_company_id() or ""
+    state = (connection.connection, tenant_company_id)
+    local_states = _get_local_states(connection)
+    if local_states:
+        current_state = local_states[-1][0]
+    else:
+        current_state = getattr(connection, "_tenant_rls_state", None)
+    if current_state != state:
+        is_local = connection.in_atomic_block
+        # The raw cursor does not go through the execute wrappers again.
+        _apply_rls_state(context["cursor"].cursor, tenant_company_id, is_local)
+        if is_local:
+            marker = functools.partial(_noop)
+            connection.on_commit(marker)
+            connection._tenant_rls_local_states = [*local_states, (state, marker)]
+        else:
+            connection._tenant_rls_state = state
+    return execute(sql, params, many, context)
+
+
+def _install_rls_execute_wrapper(connection, reset_state):
+    if connection.vendor != "postgresql":
+        return
+    if rls_execute_wrapper in connection.execute_wrappers:
+        if reset_state:
+            connection._tenant_rls_state = None
+            connection._tenant_rls_local_states = None
+        return
+    # The settings of the session are unknown, they are applied before the next query.
+    connection._tenant_rls_state = None
+    connection._tenant_rls_local_states = None
+    # First, so that the wrappers added and popped by position around a block
+    # (`connection.execute_wrapper()`) cannot remove it.
+    connection.execute_wrappers.insert(0, rls_execute_wrapper)
+
+
+def install_rls_execute_wrapper(sender, connection, **kwargs):
+    """
+    `connection_created` receiver, connected when TENANT_RLS_ENABLED.
+    """
+    # A new or pooled connection may carry the settings of another session.
+    _install_rls_execute_wrapper(connection, reset_state=True)
+
+
+def ensure_rls_execute_wrappers():
+    """
+    Re-installs the wrapper on the open connections of the thread, if it was removed.
+    Called by the TenantRLSMiddleware at the start of every request.
+    """
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        _install_rls_execute_wrapper(connection, reset_state=False)
+
+
+def enable_tenant_rls(schema_editor, model):
+    table = schema_editor.quote_name(model._meta.db_table)
+    column = schema_editor.quote_name(model._meta.get_field("tenant_company").column)
+    schema_editor.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+    schema_editor.execute(
+        f"CREATE POLICY {POLICY_NAME} ON {table} "
+        f"USING ({column} = NULLIF(current_setting('{TENANT_SETTING_NAME}', true), '')::uuid) "
+        f"WITH CHECK ({column} = NULLIF(current_setting('{TENANT_SETTING_NAME}', true), '')::uuid)"
+    )
+
+
+class EnableTenantRLS(migrations.operations.base.Operation):
+    """
+    Enables row level security on the table of a TenantCoreModel subclass and creates
+    its tenant isolation policy. A no-op on the other database backends.
+    """
+
+    reversible = True
+    reduces_to_sql = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {"model_name": self.model_name}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        enable_tenant_rls(
+            schema_editor, to_state.apps.get_model(app_label, self.model_name)
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        table = schema_editor.quote_name(model._meta.db_table)
+        schema_editor.execute(f"DROP POLICY IF EXISTS {POLICY_NAME} ON {table}")
+        schema_editor.execute(f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY")
+
+    def describe(self):
+        return f"Enable row level security on {self.model_name}"
+
+    @property
+    def migration_name_fragment(self):
+        return f"{self.model_name.lower()}_rls"
@@ -1,3 +1,424 @@
-from django.test import TestCase
+import uuid
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from company.models import Company, ExpenseType
+from core import cache_invalidation
+from native_account.models import Account, AccountCompany, RoleChoices
+from tenant import rls
+from tenant.caches import selected_tenant_cache, validated_tenant_cache
+from tenant.query_cache import (
+    get_query_cache_key,
+    invalidate_model_queries,
+    invalidate_tenant_queries,
+)
+
+
+def create_tenant(name):
+    """
+    Creates an owner user with an account and a selected company.
+    Returns (user, company).
+    """
+    user = get_user_model().objects.create_user(name, f"{name}@example.com")
+    account = Account(user=user, phone="0")
+    account.save(user=user)
+    company = Company(legal_name=name, tax_office="-", tax_no=name)
+    company.save(user=user)
+    AccountCompany(account=account, company=company, role=RoleChoices.OWNER).save(
+        user=user
+    )
+    return user, company
+
+
+class TenantTestCase(TestCase):
+    def setUp(self):
+        # The tenant caches outlive the test transactions.
+        cache.clear()
+        cache_invalidation._clear_all()
+
+
+class TenantBulkWriteTests(TenantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.company = create_tenant("tenant_a")
+        cls.other_user, cls.other_company = create_tenant("tenant_b")
+        cls.expense_type = ExpenseType.objects.create(
+            name="Travel", tenant_user=cls.user
+        )
+        cls.other_expense_type = ExpenseType.objects.create(
+            name="Travel", tenant_user=cls.other_user
+        )
+
+    def test_bulk_create_assigns_the_tenant(self):
+        expense_types = ExpenseType.objects.bulk_create(
+            [ExpenseType(name=f"Type {i}") for i in range(3)], tenant_user=self.user
+        )
+
+        self.assertEqual(
+            {(x.tenant_company_id, x.created_by_id) for x in expense_types},
+            {(self.company.id, self.user.id)},
+        )
+        self.assertEqual(
+            ExpenseType._base_manager.filter(tenant_company=self.company).count(), 4
+        )
+
+    def test_bulk_create_rejects_the_objects_of_another_tenant(self):
+        with self.assertRaises(AssertionError):
+            ExpenseType.objects.bulk_create(
+                [ExpenseType(name="Other", tenant_company=self.other_company)],
+                tenant_user=self.user,
+            )
+
+        self.assertFalse(ExpenseType._base_manager.filter(name="Other").exists())
+
+    def test_bulk_update(self):
+        self.expense_type.name = "Renamed"
+
+        updated_count = ExpenseType.objects.bulk_update(
+            [self.expense_type], ["name"], tenant_user=self.user
+        )
+
+        self.assertEqual(updated_count, 1)
+        self.expense_type.refresh_from_db()
+        self.assertEqual(self.expense_type.name, "Renamed")
+        self.assertEqual(self.expense_type.updated_by, self.user)
+
+    def test_bulk_update_rejects_the_objects_of_another_tenant(self):
+        self.other_expense_type.name = "Renamed"
+
+        with self.assertRaises(AssertionError):
+            ExpenseType.objects.bulk_update(
+                [self.other_expense_type], ["name"], tenant_user=self.user
+            )
+
+        self.other_expense_type.refresh_from_db()
+        self.assertEqual(self.other_expense_type.name, "Travel")
+
+    def test_update_is_scoped_to_the_tenant(self):
+        # A queryset spanning both tenants.
+        updated_count = ExpenseType.objects.get_queryset().update(
+            name="Renamed", tenant_user=self.user
+        )
+
+        self.assertEqual(updated_count, 1)
+        self.expense_type.refresh_from_db()
+        self.other_expense_type.refresh_from_db()
+        self.assertEqual(self.expense_type.name, "Renamed")
+        self.assertEqual(self.expense_type.updated_by, self.user)
+        self.assertEqual(self.other_expense_type.name, "Travel")
+
+    def test_update_cannot_change_the_tenant(self):
+        with self.assertRaises(AssertionError):
+            ExpenseType.objects.update(
+                tenant_company=self.other_company, tenant_user=self.user
+            )
+
+    def test_delete_is_scoped_to_the_tenant(self):
+        deleted_count, _ = ExpenseType.objects.get_queryset().delete(
+            tenant_user=self.user
+        )
+
+        self.assertEqual(deleted_count, 1)
+        self.assertFalse(
+            ExpenseType._base_manager.filter(id=self.expense_type.id).exists()
+        )
+        self.assertTrue(
+            ExpenseType._base_manager.filter(id=self.other_expense_type.id).exists()
+        )
+
+
+class ValidatedTenantCacheTests(TenantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.company = create_tenant("tenant_a")
+
+    def test_save_validates_the_tenant_once(self):
+        ExpenseType(name="Travel").save(user=self.user)
+        self.assertTrue(validated_tenant_cache.get(str(self.company.id), False))
+
+        with CaptureQueriesContext(connection) as queries:
+            ExpenseType(name="Food").save(user=self.user)
+
+        validation_queries = [
+            x["sql"]
+            for x in queries.captured_queries
+            if '"company_company"' in x["sql"]
+            or '"native_account_accountcompany"' in x["sql"]
+        ]
+        self.assertEqual(validation_queries, [])
+
+    def test_company_save_invalidates_the_tenant(self):
+        ExpenseType(name="Travel").save(user=self.user)
+
+        self.company.save(user=self.user)
+
+        self.assertFalse(validated_tenant_cache.get(str(self.company.id), False))
+
+    def test_save_fails_after_the_membership_is_deleted(self):
+        ExpenseType(name="Travel").save(user=self.user)
+
+        AccountCompany.objects.filter(company=self.company).delete()
+
+        self.assertFalse(validated_tenant_cache.get(str(self.company.id), False))
+        with self.assertRaises(AssertionError):
+            ExpenseType(name="Food").save(user=self.user)
+
+    def test_unknown_tenant_is_not_cached(self):
+        unknown_company_id = uuid.uuid4()
+        selected_tenant_cache.set(self.user.id, unknown_company_id)
+
+        with self.assertRaises(AssertionError):
+            ExpenseType(name="Travel").save(user=self.user)
+
+        self.assertFalse(validated_tenant_cache.get(str(unknown_company_id), False))
+
+
+class QueryCacheTests(TenantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.company = create_tenant("tenant_a")
+        cls.other_user, cls.other_company = create_tenant("tenant_b")
+        ExpenseType.objects.bulk_create(
+            [ExpenseType(name="Travel"), ExpenseType(name="Food")], tenant_user=cls.user
+        )
+        ExpenseType.objects.create(name="Rent", tenant_user=cls.other_user)
+
+    def get_names(self, user):
+        return [
+            x.name
+            for x in ExpenseType.objects.cached(tenant_user=user).order_by("name")
+        ]
+
+    def test_results_are_cached(self):
+        self.assertEqual(self.get_names(self.user), ["Food", "Travel"])
+        self.assertEqual(ExpenseType.objects.cached(tenant_user=self.user).count(), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names(self.user), ["Food", "Travel"])
+            self.assertEqual(
+                ExpenseType.objects.cached(tenant_user=self.user).count(), 2
+            )
+
+    def test_results_are_cached_per_tenant(self):
+        self.assertEqual(self.get_names(self.user), ["Food", "Travel"])
+        self.assertEqual(self.get_names(self.other_user), ["Rent"])
+
+    def test_writes_invalidate_the_results_of_the_tenant(self):
+        self.get_names(self.user)
+        self.get_names(self.other_user)
+
+        ExpenseType(name="Office").save(user=self.user)
+        self.assertEqual(self.get_names(self.user), ["Food", "Office", "Travel"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names(self.other_user), ["Rent"])
+
+        ExpenseType.objects.filter(tenant_user=self.user, name="Office").update(
+            name="Desk", tenant_user=self.user
+        )
+        self.assertEqual(self.get_names(self.user), ["Desk", "Food", "Travel"])
+
+        ExpenseType.objects.bulk_create(
+            [ExpenseType(name="Car")], tenant_user=self.user
+        )
+        self.assertEqual(self.get_names(self.user), ["Car", "Desk", "Food", "Travel"])
+
+        ExpenseType.objects.filter(tenant_user=self.user, name="Desk").delete(
+            tenant_user=self.user
+        )
+        self.assertEqual(self.get_names(self.user), ["Car", "Food", "Travel"])
+
+    def test_bulk_update_keeps_the_results_of_the_other_tenants(self):
+        self.get_names(self.user)
+        self.get_names(self.other_user)
+        expense_type = ExpenseType.objects.get(tenant_user=self.user, name="Food")
+        expense_type.name = "Meals"
+
+        ExpenseType.objects.bulk_update([expense_type], ["name"], tenant_user=self.user)
+
+        self.assertEqual(self.get_names(self.user), ["Meals", "Travel"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names(self.other_user), ["Rent"])
+
+    def test_generations(self):
+        def get_keys():
+            return [
+                get_query_cache_key(ExpenseType, company_id, "digest")
+                for company_id in [self.company.id, self.other_company.id]
+            ]
+
+        key, other_key = get_keys()
+        self.assertEqual(get_keys(), [key, other_key])
+
+        invalidate_tenant_queries(ExpenseType, self.company.id)
+        new_key, new_other_key = get_keys()
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(new_other_key, other_key)
+
+        # Without a tenant, the results of every tenant are invalidated.
+        invalidate_tenant_queries(ExpenseType, None)
+        self.assertTrue(set(get_keys()).isdisjoint([new_key, new_other_key]))
+
+        key, other_key = get_keys()
+        invalidate_model_queries(ExpenseType)
+        self.assertTrue(set(get_keys()).isdisjoint([key, other_key]))
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "Row level security requires PostgreSQL."
+)
+class RowLevelSecurityTests(TenantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.company = create_tenant("tenant_a")
+        cls.other_user, cls.other_company = create_tenant("tenant_b")
+        ExpenseType.objects.create(name="Travel", tenant_user=cls.user)
+        ExpenseType.objects.create(name="Rent", tenant_user=cls.other_user)
+
+        role = connection.ops.quote_name(settings.TENANT_RLS_ROLE)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_roles WHERE rolname = %s", [settings.TENANT_RLS_ROLE]
+            )
+            if cursor.fetchone() is None:
+                cursor.execute(f"CREATE ROLE {role} NOLOGIN")
+            cursor.execute(f"GRANT {role} TO CURRENT_USER")
+            cursor.execute(
+                f"GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA public TO {role}"
+            )
+            cursor.execute(f"GRANT USAGE ON ALL SEQUENCES IN SCHEMA public TO {role}")
+
+    def setUp(self):
+        super().setUp()
+        connection.ensure_connection()
+        self.addCleanup(self.uninstall_wrapper)
+
+    def uninstall_wrapper(self):
+        if rls.rls_execute_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(rls.rls_execute_wrapper)
+
+    def set_tenant(self, tenant_company_id):
+        token = rls.set_rls_tenant_company_id(tenant_company_id)
+        self.addCleanup(rls.reset_rls_tenant_company_id, token)
+
+    def test_wrapper_is_installed_first_and_once(self):
+        connection.execute_wrappers.append(lambda execute, *args: execute(*args))
+        self.addCleanup(connection.execute_wrappers.pop)
+
+        rls.install_rls_execute_wrapper(None, connection)
+        rls.install_rls_execute_wrapper(None, connection)
+
+        self.assertIs(connection.execute_wrappers[0], rls.rls_execute_wrapper)
+        self.assertEqual(connection.execute_wrappers.count(rls.rls_execute_wrapper), 1)
+
+    def test_wrapper_outlives_the_execute_wrapper_blocks(self):
+        rls.install_rls_execute_wrapper(None, connection)
+
+        with connection.execute_wrapper(lambda execute, *args: execute(*args)):
+            pass
+
+        self.assertIn(rls.rls_execute_wrapper, connection.execute_wrappers)
+
+    def test_ensure_reinstalls_a_removed_wrapper(self):
+        rls.install_rls_execute_wrapper(None, connection)
+        connection.execute_wrappers.remove(rls.rls_execute_wrapper)
+
+        rls.ensure_rls_execute_wrappers()
+
+        self.assertIs(connection.execute_wrappers[0], rls.rls_execute_wrapper)
+
+    def test_queries_return_only_the_rows_of_the_tenant(self):
+        rls.install_rls_execute_wrapper(None, connection)
+        self.set_tenant(self.company.id)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT tenant_company_id FROM {ExpenseType._meta.db_table}"
+            )
+            tenant_company_ids = [row[0] for row in cursor.fetchall()]
+        names = list(ExpenseType._base_manager.values_list("name", flat=True))
+
+        self.assertEqual(tenant_company_ids, [self.company.id])
+        self.assertEqual(names, ["Travel"])
+
+    def test_rows_of_another_tenant_cannot_be_written(self):
+        rls.install_rls_execute_wrapper(None, connection)
+        self.set_tenant(self.company.id)
+
+        updated_count = ExpenseType._base_manager.filter(
+            tenant_company=self.other_company
+        ).update(name="Renamed")
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            ExpenseType._base_manager.bulk_create(
+                [ExpenseType(name="Other", tenant_company=self.other_company)]
+            )
+
+        self.assertEqual(updated_count, 0)
+        self.set_tenant(None)
+        self.assertEqual(
+            list(
+                ExpenseType._base_manager.filter(
+                    tenant_company=self.other_company
+                ).values_list("name", flat=True)
+            ),
+            ["Rent"],
+        )
+
+    def get_names(self):
+        return list(ExpenseType._base_manager.values_list("name", flat=True))
+
+    def test_settings_are_applied_once_per_transaction(self):
+        rls.install_rls_execute_wrapper(None, connection)
+        self.set_tenant(self.company.id)
+
+        with mock.patch.object(
+            rls, "_apply_rls_state", wraps=rls._apply_rls_state
+        ) as apply_rls_state:
+            with transaction.atomic():
+                self.assertEqual(self.get_names(), ["Travel"])
+                ExpenseType._base_manager.filter(name="Travel").update(name="Trip")
+                self.assertEqual(self.get_names(), ["Trip"])
+
+        self.assertEqual(apply_rls_state.call_count, 1)
+
+    def test_settings_follow_the_savepoint_rollbacks(self):
+        rls.install_rls_execute_wrapper(None, connection)
+        self.set_tenant(self.company.id)
+        self.assertEqual(self.get_names(), ["Travel"])
+
+        token = rls.set_rls_tenant_company_id(self.other_company.id)
+        try:
+            with transaction.atomic():
+                self.assertEqual(self.get_names(), ["Rent"])
+                raise DatabaseError
+        except DatabaseError:
+            pass
+
+        # PostgreSQL reverted the settings of the savepoint.
+        self.assertEqual(self.get_names(), ["Rent"])
+        rls.reset_rls_tenant_company_id(token)
+        self.assertEqual(self.get_names(), ["Travel"])
+
+        with transaction.atomic():
+            self.set_tenant(self.other_company.id)
+            self.assertEqual(self.get_names(), ["Rent"])
+            transaction.set_rollback(True)
+        self.assertEqual(self.get_names(), ["Rent"])
+
+    @override_settings(TENANT_RLS_ENABLED=True)
+    def test_request_installs_the_wrapper(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("expense-type-list"))
+        content = b"".join(response) if response.streaming else response.content
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(connection.execute_wrappers[0], rls.rls_execute_wrapper)
+        self.assertIn(b"Travel", content)
+        self.assertNotIn(b"Rent", content)
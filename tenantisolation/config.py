@@ -34,12 +34,62 @@ REDIS_SOCKET_TIMEOUT = os.getenv("SOCKET_TIMEOUT", 5)
 
 # CACHE SETTINGS
 CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis")
+CACHE_INVALIDATION_CHANNEL = env.str("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+CACHE_INVALIDATION_RETRY_DELAY = env.int("CACHE_INVALIDATION_RETRY_DELAY", 5)
+# Seconds a worker serves the constance values from memory, see core.constance_snapshot.
+CONSTANCE_SNAPSHOT_TTL = env.int("CONSTANCE_SNAPSHOT_TTL", 30)
 
+# REQUEST LOG SETTINGS
+REQUEST_LOG_SINK = env.str("REQUEST_LOG_SINK", "core.log_sink.LoggerSink")
+REQUEST_LOG_FILE = env.str("REQUEST_LOG_FILE", "request_log.jsonl")
+REQUEST_LOG_BUFFER_SIZE = env.int("REQUEST_LOG_BUFFER_SIZE", 10000)
+REQUEST_LOG_BATCH_SIZE = env.int("REQUEST_LOG_BATCH_SIZE", 500)
+REQUEST_LOG_FLUSH_INTERVAL = env.float("REQUEST_LOG_FLUSH_INTERVAL", 2.0)
+
+# METRICS SETTINGS
+METRICS_ENABLED = env.bool("METRICS_ENABLED", True)
 
 POSTGRES_SERVER = os.getenv("POSTGRES_SERVER")
 POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
+# Persistent connections are reused for POSTGRES_CONN_MAX_AGE seconds and checked before reuse.
+POSTGRES_CONN_MAX_AGE = env.int("POSTGRES_CONN_MAX_AGE", 60)
+POSTGRES_CONN_HEALTH_CHECKS = env.bool("POSTGRES_CONN_HEALTH_CHECKS", True)
+# Connection pool of Django 5.1 (needs psycopg>=3.2 and psycopg-pool instead of psycopg2),
+# replaces the persistent connections. Preferred for ASGI deployments.
+POSTGRES_CONN_POOL = env.bool("POSTGRES_CONN_POOL", False)
+POSTGRES_CONN_POOL_MIN_SIZE = env.int("POSTGRES_CONN_POOL_MIN_SIZE", 2)
+POSTGRES_CONN_POOL_MAX_SIZE = env.int("POSTGRES_CONN_POOL_MAX_SIZE", 10)
+POSTGRES_CONN_POOL_TIMEOUT = env.int("POSTGRES_CONN_POOL_TIMEOUT", 10)
+# Read replicas as "host" or "host:port", with the same database and credentials as the primary.
+POSTGRES_REPLICA_SERVERS = env.list("POSTGRES_REPLICA_SERVERS", [])
+DB_REPLICA_SELECTION = env.str("DB_REPLICA_SELECTION", "round_robin")  # or least_connections
+DB_PRIMARY_PIN_SECONDS = env.int("DB_PRIMARY_PIN_SECONDS", 5)
+
+SHOW_DJANGO_LOG = env.bool("SHOW_DJANGO_LOG", False)
 
-SHOW_DJANGO_LOG = env.bool("SHOW_DJANGO_LOG", False)
\ No newline at end of file
+# TENANT SETTINGS
+TENANT_BULK_BATCH_SIZE = env.int("TENANT_BULK_BATCH_SIZE", 1000)
+TENANT_VALIDATION_CACHE_TIMEOUT = env.int("TENANT_VALIDATION_CACHE_TIMEOUT", 300)
+TENANT_VALIDATION_LOCAL_CACHE_TTL = env.int("TENANT_VALIDATION_LOCAL_CACHE_TTL", 30)
+TENANT_VALIDATION_LOCAL_CACHE_SIZE = env.int("TENANT_VALIDATION_LOCAL_CACHE_SIZE", 1024)
+TENANT_SELECTED_LOCAL_CACHE_TTL = env.int("TENANT_SELECTED_LOCAL_CACHE_TTL", 60)
+TENANT_SELECTED_LOCAL_CACHE_SIZE = env.int("TENANT_SELECTED_LOCAL_CACHE_SIZE", 10000)
+TENANT_ONBOARDING_LOCAL_CACHE_TTL = env.int("TENANT_ONBOARDING_LOCAL_CACHE_TTL", 300)
+TENANT_ONBOARDING_LOCAL_CACHE_SIZE = env.int("TENANT_ONBOARDING_LOCAL_CACHE_SIZE", 10000)
+TENANT_QUERY_CACHE_TIMEOUT = env.int("TENANT_QUERY_CACHE_TIMEOUT", 300)
+TENANT_QUERY_CACHE_LOCAL_TTL = env.int("TENANT_QUERY_CACHE_LOCAL_TTL", 30)
+TENANT_QUERY_CACHE_LOCAL_SIZE = env.int("TENANT_QUERY_CACHE_LOCAL_SIZE", 10000)
+# Row level security mode (PostgreSQL), see tenant.rls for the required role.
+TENANT_RLS_ENABLED = env.bool("TENANT_RLS_ENABLED", False)
+TENANT_RLS_ROLE = env.str("TENANT_RLS_ROLE", "tenant_rls")
+TENANT_PERMISSION_CACHE_TIMEOUT = env.int("TENANT_PERMISSION_CACHE_TIMEOUT", 300)
+TENANT_PERMISSION_LOCAL_CACHE_TTL = env.int("TENANT_PERMISSION_LOCAL_CACHE_TTL", 30)
+TENANT_PERMISSION_LOCAL_CACHE_SIZE = env.int("TENANT_PERMISSION_LOCAL_CACHE_SIZE", 10000)
+TENANT_ACCOUNT_INFO_CACHE_TIMEOUT = env.int("TENANT_ACCOUNT_INFO_CACHE_TIMEOUT", 300)
+TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL = env.int("TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL", 30)
+TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE = env.int("TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE", 10000)
+# PostgreSQL partitioning of the tenant tables, see tenant.partitioning.
+TENANT_PARTITIONING_ENABLED = env.bool("TENANT_PARTITIONING_ENABLED", False)
\ No newline at end of file
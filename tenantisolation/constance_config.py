@@ -11,6 +11,14 @@ CONSTANCE_CONFIG = {
         False,
         "Enable or disable the LoggingMiddleware logger dumps.",
     ),
+    "REQUEST_LOG_SAMPLE_RATE": (
+        1.0,
+        "Fraction of the requests (0.0 - 1.0) logged by the LoggingMiddleware.",
+    ),
+    "REQUEST_LOG_EXCLUDED_PATHS": (
+        "/static/,/media/,/favicon.ico",
+        "Comma separated path prefixes which are not logged by the LoggingMiddleware.",
+    ),
     "ENABLE_REDIRECT_MIDDLEWARE": (
         False,
         "Enable or disable redirection in the RedirectMiddleware.",
@@ -25,6 +33,8 @@ CONSTANCE_CONFIG_FIELDSETS = {
         "STATIC_VERSION",
         "ADMIN_SITE_ISOLATION",
         "ENABLE_LOGGING_MIDDLEWARE_DUMPS",
+        "REQUEST_LOG_SAMPLE_RATE",
+        "REQUEST_LOG_EXCLUDED_PATHS",
         "ENABLE_REDIRECT_MIDDLEWARE",
     ],
 }
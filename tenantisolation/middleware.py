@@ -1,10 +1,309 @@
-from constance import config as constance_config
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from core.constance_snapshot import config as constance_config
 from datetime import datetime
 import logging
+import random
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class DatabaseRoutingMiddleware:
+    """
+    Chooses the read replica of the request and pins the client to the primary
+    for DB_PRIMARY_PIN_SECONDS after a request writes, see core.db_router.
+    Must be placed before the middlewares which query the database.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        from core import db_router
+
+        token = db_router.start_request(self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+            self.set_pin_cookie(response)
+        finally:
+            db_router.end_request(token)
+        return response
+
+    async def __acall__(self, request):
+        from core import db_router
+
+        token = db_router.start_request(self.is_pinned(request))
+        try:
+            response = await self.get_response(request)
+            self.set_pin_cookie(response)
+        finally:
+            db_router.end_request(token)
+        return response
+
+    def is_pinned(self, request):
+        from core.db_router import PRIMARY_PIN_COOKIE_NAME
+
+        return PRIMARY_PIN_COOKIE_NAME in request.COOKIES
+
+    def set_pin_cookie(self, response):
+        from django.conf import settings
+        from core.db_router import (
+            PRIMARY_PIN_COOKIE_NAME,
+            has_written,
+            replica_selector,
+        )
+
+        if not has_written() or not replica_selector.get_replicas():
+            return
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE_NAME,
+            "1",
+            max_age=settings.DB_PRIMARY_PIN_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+class UserSessionIndexMiddleware:
+    """
+    Indexes the session key rotated during the request, e.g. by update_session_auth_hash()
+    after a password change, so that revoke_user_sessions() finds the session.
+    Must be placed after the SessionMiddleware, see native_account.sessions.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        session_key = request.session.session_key
+        response = self.get_response(request)
+        if request.session.session_key != session_key:
+            self.index_session(request, session_key)
+        return response
+
+    async def __acall__(self, request):
+        session_key = request.session.session_key
+        response = await self.get_response(request)
+        if request.session.session_key != session_key:
+            await sync_to_async(self.index_session)(request, session_key)
+        return response
+
+    def index_session(self, request, old_session_key):
+        from django.contrib.auth import SESSION_KEY
+        from native_account.sessions import add_user_session, remove_user_session
+
+        # A logout flushes the session, which no longer has a user.
+        user_id = request.session.get(SESSION_KEY)
+        if not user_id or not request.session.session_key:
+            return
+        add_user_session(user_id, request.session.session_key)
+        if old_session_key:
+            # cycle_key() deleted the old session.
+            remove_user_session(user_id, old_session_key)
+
+
+class TenantContextMiddleware:
+    """
+    Attaches a request-scoped TenantContext to the request, so that the tenant
+    of the user is resolved at most once per request.
+    Must be placed after the AuthenticationMiddleware.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        from tenant.context import (
+            TenantContext,
+            set_current_tenant_context,
+            reset_current_tenant_context,
+        )
+
+        request.tenant_context = TenantContext(request.user)
+        token = set_current_tenant_context(request.tenant_context)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_current_tenant_context(token)
+        return response
+
+    async def __acall__(self, request):
+        from tenant.context import (
+            TenantContext,
+            set_current_tenant_context,
+            reset_current_tenant_context,
+        )
+
+        request.tenant_context = TenantContext(await request.auser())
+        token = set_current_tenant_context(request.tenant_context)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_current_tenant_context(token)
+        return response
+
+
+class TenantRLSMiddleware:
+    """
+    Sets the tenant of the request for the row level security policies
+    (TENANT_RLS_ENABLED), see tenant.rls.
+    Must be placed after the TenantContextMiddleware.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        from tenant.rls import (
+            ensure_rls_execute_wrappers,
+            is_rls_enabled,
+            set_rls_tenant_company_id,
+            reset_rls_tenant_company_id,
+        )
+
+        if not is_rls_enabled():
+            return self.get_response(request)
+        ensure_rls_execute_wrappers()
+        if not request.tenant_context.user_id:
+            return self.get_response(request)
+
+        token = set_rls_tenant_company_id(request.tenant_context.company_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_rls_tenant_company_id(token)
+        return response
+
+    async def __acall__(self, request):
+        from tenant.rls import (
+            ensure_rls_execute_wrappers,
+            is_rls_enabled,
+            set_rls_tenant_company_id,
+            reset_rls_tenant_company_id,
+        )
+
+        if not is_rls_enabled():
+            return await self.get_response(request)
+        # On the thread which runs the ORM queries of the async views.
+        await sync_to_async(ensure_rls_execute_wrappers)()
+        if not request.tenant_context.user_id:
+            return await self.get_response(request)
+
+        token = set_rls_tenant_company_id(
+            await request.tenant_context.aget_company_id()
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_rls_tenant_company_id(token)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, the DB queries, the cache hits/misses and the response size
+    of every request per view and tenant, see core.metrics.
+    Must be placed after the TenantContextMiddleware.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        from django.conf import settings
+
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        from core.metrics import measure_request
+
+        started_at = time.perf_counter()
+        with measure_request() as stats:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started_at
+
+        tenant_context = getattr(request, "tenant_context", None)
+        tenant = ""
+        if tenant_context is not None and tenant_context.user_id:
+            tenant = tenant_context.company_id or ""
+        self.record(request, response, tenant, duration, stats)
+        return response
+
+    async def __acall__(self, request):
+        from django.conf import settings
+
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        from core.metrics import measure_request
+
+        started_at = time.perf_counter()
+        with measure_request() as stats:
+            response = await self.get_response(request)
+        duration = time.perf_counter() - started_at
+
+        tenant_context = getattr(request, "tenant_context", None)
+        tenant = ""
+        if tenant_context is not None and tenant_context.user_id:
+            tenant = await tenant_context.aget_company_id() or ""
+        self.record(request, response, tenant, duration, stats)
+        return response
+
+    def record(self, request, response, tenant, duration, stats):
+        from core.metrics import record_request
+
+        resolver_match = getattr(request, "resolver_match", None)
+        record_request(
+            view=resolver_match.view_name if resolver_match else "<unresolved>",
+            tenant=tenant,
+            status_code=response.status_code,
+            duration=duration,
+            stats=stats,
+            response_size=None if response.streaming else len(response.content),
+        )
+
+
 class RedirectMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -23,6 +322,12 @@ class RedirectMiddleware:
             response = self.get_response(request)
             return response
 
+        from tenant.caches import onboarded_user_cache
+
+        # Fully onboarded users never get redirected, they skip the account lookups.
+        if onboarded_user_cache.get(user.id, False):
+            return self.get_response(request)
+
         from django.http import HttpResponseRedirect
         from django.urls import reverse
         from django.contrib import messages
@@ -41,6 +346,8 @@ class RedirectMiddleware:
             )
             msgs[messages.INFO].append(_("You can create a company from this page."))
             redirect_url = reverse("create-company")
+        else:
+            onboarded_user_cache.set(user.id, True)
 
         is_current_path_equal_to_redirect = request.path == redirect_url
 
@@ -57,8 +364,32 @@ class RedirectMiddleware:
 
 
 class LoggingMiddleware:
+    """
+    Hands the request/response logs to the batched sink in core.log_sink.
+    Nothing is written on the request path; sampling and path exclusion are
+    configured with REQUEST_LOG_SAMPLE_RATE and REQUEST_LOG_EXCLUDED_PATHS.
+    """
+
+    async_capable = True
+    sync_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def is_logged(self, request):
+        if not constance_config.ENABLE_LOGGING_MIDDLEWARE_DUMPS:
+            return False
+        excluded_paths = tuple(
+            x.strip()
+            for x in constance_config.REQUEST_LOG_EXCLUDED_PATHS.split(",")
+            if x.strip()
+        )
+        if excluded_paths and request.path_info.startswith(excluded_paths):
+            return False
+        sample_rate = constance_config.REQUEST_LOG_SAMPLE_RATE
+        return sample_rate >= 1 or random.random() < sample_rate
 
     def __call__(self, request):
         """
@@ -114,31 +445,55 @@ class LoggingMiddleware:
         X-Permitted-Cross-Domain-Policies  # Controls the cross-domain policy for Flash and other client-side technologies
         """
 
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self.is_logged(request):
+            return self.get_response(request)
+
+        started_at = time.perf_counter()
+        request_log = self.get_request_log(request, request.user)
+        response = self.get_response(request)
+        self.log(request_log, response, started_at)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_logged(request):
+            return await self.get_response(request)
+
+        started_at = time.perf_counter()
+        request_log = self.get_request_log(request, await request.auser())
+        response = await self.get_response(request)
+        self.log(request_log, response, started_at)
+        return response
+
+    def get_request_log(self, request, user):
         """Log request details"""
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR", "")
         if x_forwarded_for:
             x_forwarded_for = x_forwarded_for.split(",")[0]
 
-        request_log = {
+        return {
             "host": request.META.get("HTTP_HOST", ""),
             "x_forwarded_for": x_forwarded_for,
             "remote_addr": request.META.get("REMOTE_ADDR", ""),
             "user_agent": request.META.get("HTTP_USER_AGENT", ""),
             "referer": request.META.get("HTTP_REFERER", ""),
+            "method": request.method,
+            "path": request.path_info,
             "time": datetime.now().isoformat(),
-            "username": request.user.username if request.user.is_authenticated else "",
-            "user_id": request.user.id if request.user.is_authenticated else "",
+            "username": user.username if user.is_authenticated else "",
+            "user_id": user.id if user.is_authenticated else "",
         }
-        request.session["request_log"] = request_log
-        request.session.save()
 
-        """Process the request"""
-        response = self.get_response(request)
+    def log(self, request_log, response, started_at):
+        from core.log_sink import request_log_buffer
 
         """Log response details"""
         response_log = {
             "status_code": response.status_code,
             "time": datetime.now().isoformat(),
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 3),
         }
 
         """Merge logs"""
@@ -146,9 +501,4 @@ class LoggingMiddleware:
             "request_log": request_log,
             "response_log": response_log,
         }
-        if constance_config.ENABLE_LOGGING_MIDDLEWARE_DUMPS:
-            import json
-
-            logger.info(json.dumps(log))
-
-        return response
+        request_log_buffer.append(log)
@@ -58,6 +58,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # OpClass() in the index expressions, e.g. company.ExpenseType.
+    "django.contrib.postgres",
     "dal",
     "dal_select2",
     'django.contrib.admin',
@@ -71,11 +73,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    "tenantisolation.middleware.DatabaseRoutingMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
+    "tenantisolation.middleware.UserSessionIndexMiddleware",
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    "tenantisolation.middleware.TenantContextMiddleware",
+    "tenantisolation.middleware.TenantRLSMiddleware",
+    "tenantisolation.middleware.MetricsMiddleware",
     'django.contrib.messages.middleware.MessageMiddleware',
+    # A no-op unless ENABLE_REDIRECT_MIDDLEWARE (constance) is on.
+    "tenantisolation.middleware.RedirectMiddleware",
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "tenantisolation.middleware.LoggingMiddleware",
 ]
@@ -114,13 +123,34 @@ DATABASES = {
         "PASSWORD": config.POSTGRES_PASSWORD,
         "HOST": config.POSTGRES_SERVER,
         "PORT": config.POSTGRES_PORT,
-        # 'CONN_MAX_AGE': 5,
-        # 'CONN_MAX_AGE': config.POSTGRES_CONN_MAX_AGE,
+        # The pool cannot be combined with persistent connections.
+        "CONN_MAX_AGE": 0 if config.POSTGRES_CONN_POOL else config.POSTGRES_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": config.POSTGRES_CONN_HEALTH_CHECKS,
         "DISABLE_SERVER_SIDE_CURSORS": True,
         # 'ATOMIC_REQUESTS': False,
         "OPTIONS": {"connect_timeout": 30},
     },
 }
+if config.POSTGRES_CONN_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": config.POSTGRES_CONN_POOL_MIN_SIZE,
+        "max_size": config.POSTGRES_CONN_POOL_MAX_SIZE,
+        "timeout": config.POSTGRES_CONN_POOL_TIMEOUT,
+    }
+
+# Read replicas, see core.db_router
+for index, server in enumerate(config.POSTGRES_REPLICA_SERVERS, start=1):
+    host, _, port = server.partition(":")
+    DATABASES["replica" if index == 1 else f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or config.POSTGRES_PORT,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["core.db_router.ReadWriteRouter"]
+DB_REPLICA_SELECTION = config.DB_REPLICA_SELECTION
+DB_PRIMARY_PIN_SECONDS = config.DB_PRIMARY_PIN_SECONDS
 
 
 # Password validation
@@ -173,9 +203,33 @@ CONSTANCE_REDIS_CONNECTION = {
     "db": config.REDIS_DB,
     "password": config.REDIS_PASSWORD,
 }
+CONSTANCE_SNAPSHOT_TTL = config.CONSTANCE_SNAPSHOT_TTL
 from tenantisolation.constance_config import *
 
 
+# Tenant isolation
+TENANT_BULK_BATCH_SIZE = config.TENANT_BULK_BATCH_SIZE
+TENANT_VALIDATION_CACHE_TIMEOUT = config.TENANT_VALIDATION_CACHE_TIMEOUT
+TENANT_VALIDATION_LOCAL_CACHE_TTL = config.TENANT_VALIDATION_LOCAL_CACHE_TTL
+TENANT_VALIDATION_LOCAL_CACHE_SIZE = config.TENANT_VALIDATION_LOCAL_CACHE_SIZE
+TENANT_SELECTED_LOCAL_CACHE_TTL = config.TENANT_SELECTED_LOCAL_CACHE_TTL
+TENANT_SELECTED_LOCAL_CACHE_SIZE = config.TENANT_SELECTED_LOCAL_CACHE_SIZE
+TENANT_ONBOARDING_LOCAL_CACHE_TTL = config.TENANT_ONBOARDING_LOCAL_CACHE_TTL
+TENANT_ONBOARDING_LOCAL_CACHE_SIZE = config.TENANT_ONBOARDING_LOCAL_CACHE_SIZE
+TENANT_QUERY_CACHE_TIMEOUT = config.TENANT_QUERY_CACHE_TIMEOUT
+TENANT_QUERY_CACHE_LOCAL_TTL = config.TENANT_QUERY_CACHE_LOCAL_TTL
+TENANT_QUERY_CACHE_LOCAL_SIZE = config.TENANT_QUERY_CACHE_LOCAL_SIZE
+TENANT_PARTITIONING_ENABLED = config.TENANT_PARTITIONING_ENABLED
+TENANT_RLS_ENABLED = config.TENANT_RLS_ENABLED
+TENANT_RLS_ROLE = config.TENANT_RLS_ROLE
+TENANT_PERMISSION_CACHE_TIMEOUT = config.TENANT_PERMISSION_CACHE_TIMEOUT
+TENANT_PERMISSION_LOCAL_CACHE_TTL = config.TENANT_PERMISSION_LOCAL_CACHE_TTL
+TENANT_PERMISSION_LOCAL_CACHE_SIZE = config.TENANT_PERMISSION_LOCAL_CACHE_SIZE
+TENANT_ACCOUNT_INFO_CACHE_TIMEOUT = config.TENANT_ACCOUNT_INFO_CACHE_TIMEOUT
+TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL = config.TENANT_ACCOUNT_INFO_LOCAL_CACHE_TTL
+TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE = config.TENANT_ACCOUNT_INFO_LOCAL_CACHE_SIZE
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -198,6 +252,20 @@ if config.CACHE_BACKEND == "redis":
         }
     }
 
+# In-process cache invalidations, see core.cache_invalidation
+CACHE_INVALIDATION_CHANNEL = config.CACHE_INVALIDATION_CHANNEL
+CACHE_INVALIDATION_RETRY_DELAY = config.CACHE_INVALIDATION_RETRY_DELAY
+
+# Request logs of the LoggingMiddleware, see core.log_sink
+REQUEST_LOG_SINK = config.REQUEST_LOG_SINK
+REQUEST_LOG_FILE = config.REQUEST_LOG_FILE
+REQUEST_LOG_BUFFER_SIZE = config.REQUEST_LOG_BUFFER_SIZE
+REQUEST_LOG_BATCH_SIZE = config.REQUEST_LOG_BATCH_SIZE
+REQUEST_LOG_FLUSH_INTERVAL = config.REQUEST_LOG_FLUSH_INTERVAL
+
+# Per view/tenant request metrics, see core.metrics
+METRICS_ENABLED = config.METRICS_ENABLED
+
 
 if config.SHOW_DJANGO_LOG:
     import logging.config